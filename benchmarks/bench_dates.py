@@ -0,0 +1,47 @@
+"""Compare parsing of episode dates as printed on Govorit Moskva pages.
+
+Run from the project root: python -m benchmarks.bench_dates
+"""
+from datetime import date
+
+from benchmarks.common import measure, report, setup_django
+
+RAW_DATES = [
+    f'{day:02} {month}'
+    for month in ('января', 'марта', 'июля', 'октября', 'декабря')
+    for day in range(1, 29)
+]
+
+
+def main() -> None:
+    setup_django()
+
+    import dateparser
+
+    from rsser import parsers
+
+    year = date.today().year
+
+    def with_dateparser():
+        for raw_dt in RAW_DATES:
+            dateparser.parse(raw_dt, ['ru'])
+
+    def fast_path_cold():
+        parsers.parse_ru_date_fast.cache_clear()
+        for raw_dt in RAW_DATES:
+            parsers.parse_ru_datetime(raw_dt, year)
+
+    def fast_path_cached():
+        for raw_dt in RAW_DATES:
+            parsers.parse_ru_datetime(raw_dt, year)
+
+    results = {
+        'dateparser.parse': measure(with_dateparser, number=3),
+        'parse_ru_datetime, cold cache': measure(fast_path_cold, number=3),
+        'parse_ru_datetime, warm cache': measure(fast_path_cached, number=3),
+    }
+    report(f'{len(RAW_DATES)} episode dates', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare feedgen with the streaming RSS writer on a synthetic feed.
+
+Run from the project root: python -m benchmarks.bench_feed_writer
+"""
+from datetime import datetime, timedelta
+
+from benchmarks.common import measure, report, setup_django
+
+EPISODES_COUNT = 200
+
+
+def main() -> None:
+    setup_django()
+
+    from rsser import parsers, rss
+    from rsser.models import Episode, Program, Station
+
+    station = Station(name='Говорит Москва', short_latin_name='gm')
+    program = Program(
+        title_ru='Своя правда',
+        title_en='svoja_pravda',
+        description='Дебаты по актуальным темам дня.',
+        url='https://govoritmoskva.ru/broadcasts/161/',
+        image_path='https://my.domain.com/images/svoja_pravda.png',
+        station=station,
+    )
+
+    first_date = datetime(2019, 7, 4)
+    episodes = [
+        Episode(
+            date=first_date - timedelta(days=i),
+            title=f'Выпуск {i}',
+            description='<b>Гость</b><br>Эксперт &amp; аналитик<br>' * 3,
+            duration=3000 + i,
+            file_url=f'https://govoritmoskva.ru/media/audio/{i}.mp3',
+            file_size=48000000 + i,
+        )
+        for i in range(EPISODES_COUNT)
+    ]
+
+    cases = {
+        'feedgen, pretty': lambda: parsers.collect_feed(
+            program, episodes
+        ).rss_str(pretty=True),
+        'stream writer, pretty': lambda: rss.rss_bytes(
+            program, episodes, pretty=True
+        ),
+        'stream writer, compact': lambda: rss.rss_bytes(
+            program, episodes, pretty=False
+        ),
+    }
+
+    results = {name: measure(case) for name, case in cases.items()}
+    report(f'Feed with {EPISODES_COUNT} episodes', results)
+
+
+if __name__ == '__main__':
+    main()
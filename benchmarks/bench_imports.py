@@ -0,0 +1,109 @@
+"""Time the imports of the web entry points and the management commands.
+
+Run from the project root: python -m benchmarks.bench_imports
+Every import runs in a fresh interpreter under -X importtime. The median
+cumulative time is compared with its budget, and the run exits with an
+error when one of them is over.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+from benchmarks.common import ROOT_DIR, setup_django
+
+# Seconds of cumulative import time, with room for slower machines
+WSGI_BUDGET = 1.5
+URLS_BUDGET = 0.15
+COMMAND_BUDGET = 0.5
+
+IMPORT_TIME_RE = re.compile(
+    r'^import time:\s+\d+ \|\s+(?P<cumulative>\d+) \| (?P<module>.+)$',
+    re.MULTILINE,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+
+    return parser.parse_args()
+
+
+def import_times(code: str) -> Dict[str, float]:
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'project.settings',
+        ),
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return {
+        match['module'].strip(): int(match['cumulative']) / 1_000_000
+        for match
+        in IMPORT_TIME_RE.finditer(result.stderr)
+    }
+
+
+def median_time(code: str, module: str, repeat: int) -> float:
+    return statistics.median(
+        import_times(code)[module] for _ in range(repeat)
+    )
+
+
+def command_modules() -> List[str]:
+    from django.core.management import get_commands
+
+    return sorted(
+        f'rsser.management.commands.{name}'
+        for name, app in get_commands().items()
+        if app == 'rsser'
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    setup_django()
+
+    web_code = 'import project.wsgi; import project.urls'
+    checks = [
+        ('project.wsgi', web_code, WSGI_BUDGET),
+        ('project.urls', web_code, URLS_BUDGET),
+    ]
+    checks.extend(
+        (module, f'import django; django.setup(); import {module}',
+         COMMAND_BUDGET)
+        for module in command_modules()
+    )
+
+    over_budget = []
+    print(f'Median cumulative import time of {args.repeat} runs')
+
+    for module, code, budget in checks:
+        elapsed = median_time(code, module, args.repeat)
+        status = 'ok' if elapsed < budget else 'OVER'
+        print(
+            f'  {module:<50} {elapsed * 1000:9.1f} ms'
+            f'  budget {budget * 1000:7.1f} ms  {status}'
+        )
+
+        if elapsed >= budget:
+            over_budget.append(module)
+
+    if over_budget:
+        sys.exit(f'Over the import time budget: {", ".join(over_budget)}')
+
+
+if __name__ == '__main__':
+    main()
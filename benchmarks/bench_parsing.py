@@ -0,0 +1,42 @@
+"""Compare parsing of a saved Govorit Moskva program page.
+
+Run from the project root: python -m benchmarks.bench_parsing
+"""
+from bs4 import BeautifulSoup
+
+from benchmarks.common import cassette_body, measure, report, setup_django
+
+
+def main() -> None:
+    setup_django()
+
+    from rsser import parsers
+
+    content = cassette_body('gm/episode.json')
+
+    def find_episodes(soup):
+        page = soup.find('div', {'class': 'oneProgramPage'})
+        return page.ul.findChildren('li', recursive=False)
+
+    cases = {
+        'html.parser, whole page': lambda: find_episodes(
+            BeautifulSoup(content, 'html.parser')
+        ),
+        'lxml, whole page': lambda: find_episodes(
+            BeautifulSoup(content, 'lxml')
+        ),
+        'html.parser, oneProgramPage only': lambda: find_episodes(
+            BeautifulSoup(content, 'html.parser',
+                          parse_only=parsers.GM_PROGRAM_PAGE)
+        ),
+        'lxml, oneProgramPage only': lambda: find_episodes(
+            BeautifulSoup(content, 'lxml', parse_only=parsers.GM_PROGRAM_PAGE)
+        ),
+    }
+
+    results = {name: measure(case) for name, case in cases.items()}
+    report(f'Program page ({len(content)} bytes)', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Time the scrape, parse, probe and render steps against a local stub site.
+
+Run from the project root: python -m benchmarks.bench_pipeline
+Results are saved as JSON; pass --compare with an earlier results file to
+see how the current tree differs from it.
+"""
+import argparse
+import os
+from typing import Dict
+
+from benchmarks.common import (
+    ROOT_DIR,
+    git_revision,
+    load_results,
+    measure,
+    save_results,
+    setup_django,
+    test_database,
+)
+from benchmarks.stub_server import StubServer
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--output',
+        help='Where to save the results, benchmarks/results/ by default',
+    )
+    parser.add_argument(
+        '--compare',
+        metavar='RESULTS',
+        help='Earlier results file to compare against',
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='Delay added by the stub server to every response, in ms',
+    )
+    parser.add_argument('--number', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+
+    return parser.parse_args()
+
+
+def print_results(
+        results: Dict[str, dict],
+        baseline: Dict[str, dict] = None) -> None:
+
+    for name, timing in results.items():
+        line = (
+            f'  {name:<36} {timing["median"] * 1000:9.2f} ms'
+            f'  {timing["per_second"]:9.1f} {timing["unit"]}/s'
+        )
+
+        if baseline and name in baseline:
+            change = timing['median'] / baseline[name]['median'] - 1
+            line += f'  {change:+7.1%}'
+
+        print(line)
+
+
+def main() -> None:
+    args = parse_args()
+    setup_django()
+
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    from rsser import parsers
+    from rsser.models import EpisodeRecord, Station
+
+    def forget_files():
+        EpisodeRecord.objects.all().delete()
+
+    results = {}
+
+    def run(name: str, func, items: int, unit: str, **kwargs) -> None:
+        timing = measure(func, args.number, args.repeat, **kwargs)
+        timing['items'] = items
+        timing['unit'] = unit
+        timing['per_second'] = items / timing['median']
+        results[name] = timing
+
+    # A rate of 0 turns throttling off for the stub server
+    rate_limits = {**settings.SCRAPER_HOST_RATE_LIMITS, '127.0.0.1': (0, 1)}
+
+    with StubServer(latency=args.latency / 1000) as server, \
+            test_database(), \
+            override_settings(
+                HTTP_CACHE=False,
+                SCRAPER_HOST_RATE_LIMITS=rate_limits,
+            ):
+
+        # parse_gm_program builds feed URLs from it
+        os.environ['ROOT_URL'] = server.root
+
+        station = Station.objects.create(
+            name='Говорит Москва',
+            short_latin_name='gm',
+            url=server.root,
+            logo=f'{server.root}/logo.png',
+            programs_root=f'{server.root}/broadcasts/',
+        )
+
+        raw_programs = parsers.collect_gm_raw_programs(station.programs_root)
+        run(
+            'collect_gm_raw_programs',
+            lambda: parsers.collect_gm_raw_programs(station.programs_root),
+            1,
+            'pages',
+        )
+
+        run(
+            'parse_gm_program',
+            lambda: [
+                parsers.parse_gm_program(station, raw_program)
+                for raw_program
+                in raw_programs
+            ],
+            len(raw_programs),
+            'programs',
+        )
+
+        program = parsers.parse_gm_program(station, raw_programs[0])
+        program.save()
+
+        episodes = parsers.parse_gm_episodes(program)
+        run(
+            'parse_gm_episodes, new files',
+            lambda: parsers.parse_gm_episodes(program),
+            len(episodes),
+            'episodes',
+            setup=forget_files,
+        )
+        run(
+            'parse_gm_episodes, known files',
+            lambda: parsers.parse_gm_episodes(program),
+            len(episodes),
+            'episodes',
+        )
+
+        def probe_files():
+            for episode in episodes:
+                parsers.file_info(episode.file_url, episode.file_name, {})
+
+        run(
+            'file_info, range probe',
+            probe_files,
+            len(episodes),
+            'files',
+            setup=forget_files,
+        )
+        with override_settings(AUDIO_PROBE=False):
+            run(
+                'file_info, full download',
+                probe_files,
+                len(episodes),
+                'files',
+                setup=forget_files,
+            )
+
+        run(
+            'collect_feed',
+            lambda: parsers.collect_feed(program, episodes),
+            len(episodes),
+            'episodes',
+        )
+
+        requests_made = server.requests
+
+    baseline = load_results(args.compare) if args.compare else None
+
+    print(f'Pipeline against a local stub ({requests_made} requests)')
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(
+        ROOT_DIR, 'benchmarks', 'results', f'pipeline-{git_revision()}.json',
+    )
+    save_results(
+        output,
+        results,
+        latency_ms=args.latency,
+        episode_workers=settings.EPISODE_WORKERS,
+        month_workers=settings.MONTH_WORKERS,
+        audio_probe_bytes=settings.AUDIO_PROBE_BYTES,
+    )
+    print(f'Saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
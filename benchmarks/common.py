@@ -0,0 +1,129 @@
+import base64
+import gzip
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import django
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASSETTES_DIR = os.path.join(ROOT_DIR, 'rsser', 'tests', 'cassettes')
+
+
+def setup_django() -> None:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    # A throwaway database, so benchmarks never touch db.sqlite3. It is a
+    # file rather than SQLite's shared in-memory database, which locks up
+    # when worker threads write to it.
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tmp_dir, 'bench.sqlite3',
+        )
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+
+def cassette_body(name: str) -> bytes:
+    with open(os.path.join(CASSETTES_DIR, name)) as f:
+        cassette = json.load(f)
+
+    body = cassette['http_interactions'][0]['response']['body']
+
+    return gzip.decompress(base64.b64decode(body['base64_string']))
+
+
+def measure(
+        func: Callable,
+        number: int = 10,
+        repeat: int = 5,
+        setup: Optional[Callable] = None) -> Dict[str, float]:
+
+    timings = []
+
+    for _ in range(repeat):
+        elapsed = 0.0
+        for _ in range(number):
+            # Setup runs before every call and is not timed
+            if setup:
+                setup()
+            started = time.perf_counter()
+            func()
+            elapsed += time.perf_counter() - started
+        timings.append(elapsed / number)
+
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'max': max(timings),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def report(title: str, results: Dict[str, Dict[str, float]]) -> None:
+    print(title)
+
+    baseline = next(iter(results.values()))['median']
+
+    for name, timing in results.items():
+        speedup = baseline / timing['median']
+        print(
+            f'  {name:<40} {timing["median"] * 1000:9.3f} ms'
+            f'  x{speedup:.1f}'
+        )
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(path: str, results: Dict[str, dict], **meta) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    data = {
+        'revision': git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        **meta,
+        'results': results,
+    }
+
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    with open(path) as f:
+        return json.load(f)['results']
@@ -0,0 +1,178 @@
+"""Local stand-in for the station website used by the pipeline benchmark.
+
+Serves the fixture pages from benchmarks/fixtures and synthetic MP3 files,
+honouring Range requests the same way the station's media server does.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+MONTH_NAMES = [
+    ('Январь', 'января'),
+    ('Февраль', 'февраля'),
+    ('Март', 'марта'),
+    ('Апрель', 'апреля'),
+    ('Май', 'мая'),
+    ('Июнь', 'июня'),
+    ('Июль', 'июля'),
+    ('Август', 'августа'),
+    ('Сентябрь', 'сентября'),
+    ('Октябрь', 'октября'),
+    ('Ноябрь', 'ноября'),
+    ('Декабрь', 'декабря'),
+]
+
+PROGRAM_PATH_RE = re.compile(r'^/broadcasts/(?P<slug>[a-z_]+)/$')
+RANGE_RE = re.compile(r'^bytes=(?P<start>\d+)-(?P<end>\d*)$')
+
+# MPEG-1 Layer III, 128 kbit/s, 44100 Hz, stereo: 417 bytes per frame
+MP3_FRAME = b'\xff\xfb\x90\x00' + bytes(413)
+
+
+def synthetic_mp3(path: str, frames: int) -> bytes:
+    # A small ID3 tag in front, like the real files, and a length that
+    # varies with the path so episodes do not all look the same
+    id3 = b'ID3\x03\x00\x00\x00\x00\x02\x00' + bytes(256)
+    frames += zlib.crc32(path.encode('utf-8')) % 64
+
+    return id3 + MP3_FRAME * frames
+
+
+def render_listing(template: str, root: str, month: date) -> str:
+    previous = date(
+        month.year if month.month > 1 else month.year - 1,
+        month.month - 1 if month.month > 1 else 12,
+        1,
+    )
+    title, name = MONTH_NAMES[month.month - 1]
+
+    replacements = {
+        '%ROOT%': root,
+        '%YEAR%': str(month.year),
+        '%MONTH%': f'{month.month:02}',
+        '%MONTH_NAME%': name,
+        '%MONTH_TITLE%': title,
+        '%PREV_YEAR%': str(previous.year),
+        '%PREV_MONTH%': str(previous.month),
+    }
+
+    return re.sub(
+        '|'.join(replacements),
+        lambda match: replacements[match.group(0)],
+        template,
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes, which Nagle's algorithm would
+    # hold back for a delayed ACK and add ~40 ms to every small response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.server.requests += 1
+
+        url = urlsplit(self.path)
+
+        if url.path == '/broadcasts/':
+            return self.send_page(self.server.fixture('gm/index.html'))
+
+        match = PROGRAM_PATH_RE.match(url.path)
+        if match:
+            return self.send_program_page(match['slug'], parse_qs(url.query))
+
+        if url.path.endswith('.mp3'):
+            return self.send_audio(url.path)
+
+        self.send_error(404)
+
+    def send_program_page(self, slug: str, query: dict):
+        template = self.server.fixture(f'gm/{slug}.html')
+
+        if template is None:
+            return self.send_error(404)
+
+        try:
+            month = date(int(query['year'][0]), int(query['month'][0]), 1)
+        except (KeyError, ValueError):
+            month = date.today().replace(day=1)
+
+        self.send_page(render_listing(template, self.server.root, month))
+
+    def send_page(self, page: str):
+        if page is None:
+            return self.send_error(404)
+
+        body = page.encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_audio(self, path: str):
+        body = synthetic_mp3(path, self.server.mp3_frames)
+        total = len(body)
+        match = RANGE_RE.match(self.headers.get('Range', ''))
+
+        if match:
+            start = int(match['start'])
+            end = min(int(match['end'] or total - 1), total - 1)
+            body = body[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{total}')
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, mp3_frames: int = 2000):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.mp3_frames = mp3_frames
+        self.requests = 0
+        self.fixtures = {}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def root(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def fixture(self, name: str):
+        if name not in self.fixtures:
+            try:
+                with open(os.path.join(FIXTURES_DIR, name)) as f:
+                    self.fixtures[name] = f.read()
+            except FileNotFoundError:
+                self.fixtures[name] = None
+
+        return self.fixtures[name]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
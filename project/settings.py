@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 import os
 
 import sentry_sdk
-from decouple import config
+from decouple import Csv, config
 from sentry_sdk.integrations.django import DjangoIntegration
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -141,3 +141,149 @@ EMAIL_PORT = config('EMAIL_PORT', default='25')
 
 STATIC_URL = '/static/'
 STATIC_ROOT = config('STATIC_ROOT', default='/static/')
+
+
+# Episode audio probing
+# Read duration and size from the first bytes of an MP3 via a Range request
+# and only download the whole file when the header is not enough.
+AUDIO_PROBE = config('AUDIO_PROBE', default=True, cast=bool)
+AUDIO_PROBE_BYTES = config('AUDIO_PROBE_BYTES', default=16384, cast=int)
+DOWNLOAD_CHUNK_SIZE = config('DOWNLOAD_CHUNK_SIZE', default=65536, cast=int)
+
+
+# Scraper concurrency
+# Number of episodes of one program probed in parallel, 1 disables threads.
+EPISODE_WORKERS = config('EPISODE_WORKERS', default=4, cast=int)
+# Number of monthly listings of one program fetched in parallel.
+MONTH_WORKERS = config('MONTH_WORKERS', default=3, cast=int)
+# How far back the episode history of a program is scanned: new programs
+# get the full depth, known programs only what their cadence requires.
+GM_BACKFILL_MONTHS = config('GM_BACKFILL_MONTHS', default=6, cast=int)
+
+
+# Scraper HTTP client
+# Token bucket per host: requests per second and burst size. Hosts can be
+# tuned separately with SCRAPER_HOST_RATE_LIMITS="host=rate:burst,...".
+# Build workers split both between them, down to one request of burst.
+# Requests share a keep-alive session retrying 429/5xx with backoff.
+SCRAPER_RATE_LIMIT = config('SCRAPER_RATE_LIMIT', default=0.5, cast=float)
+SCRAPER_RATE_BURST = config('SCRAPER_RATE_BURST', default=1, cast=int)
+SCRAPER_TIMEOUT = config('SCRAPER_TIMEOUT', default=30, cast=float)
+SCRAPER_RETRIES = config('SCRAPER_RETRIES', default=3, cast=int)
+SCRAPER_BACKOFF_FACTOR = config(
+    'SCRAPER_BACKOFF_FACTOR', default=1.0, cast=float
+)
+SCRAPER_POOL_CONNECTIONS = config(
+    'SCRAPER_POOL_CONNECTIONS', default=4, cast=int
+)
+SCRAPER_POOL_SIZE = config('SCRAPER_POOL_SIZE', default=10, cast=int)
+SCRAPER_HOST_RATE_LIMITS = {
+    host: (float(rate), int(burst))
+    for host, rate, burst in (
+        item.replace('=', ':').split(':')
+        for item
+        in config('SCRAPER_HOST_RATE_LIMITS', default='', cast=Csv())
+    )
+}
+
+
+# Scraped pages cache
+# Pages are stored on disk with their ETag/Last-Modified and revalidated
+# with conditional requests; unchanged pages are not parsed twice.
+HTTP_CACHE = config('HTTP_CACHE', default=True, cast=bool)
+HTTP_CACHE_DIR = config(
+    'HTTP_CACHE_DIR',
+    default=os.path.join(BASE_DIR, 'cache', 'http'),
+)
+PARSED_PAGES_CACHE_SIZE = config(
+    'PARSED_PAGES_CACHE_SIZE', default=256, cast=int
+)
+HTML_PARSER = config('HTML_PARSER', default='lxml')
+
+
+# Cache
+# Feeds and the index page are kept in the cache framework. The commands
+# fill and invalidate it while the web workers read it, so the backend
+# must be shared between processes: files by default, or memcached.
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': config(
+            'CACHE_LOCATION',
+            default=os.path.join(BASE_DIR, 'cache', 'django'),
+        ),
+    },
+}
+# The rendered index page is dropped whenever the programs change
+INDEX_CACHE_TIMEOUT = config('INDEX_CACHE_TIMEOUT', default=300, cast=int)
+
+
+# Feeds
+# Built feeds are written to FEEDS_DIR/<station>/<program>.xml and served
+# from the cache framework, falling back to the files on a cache miss.
+FEEDS_DIR = config(
+    'FEEDS_DIR',
+    default=os.path.join(BASE_DIR, 'rsser', 'feeds'),
+)
+FEED_CACHE_TIMEOUT = config('FEED_CACHE_TIMEOUT', default=300, cast=int)
+# Feeds are rendered from the newest stored episodes of a program
+FEED_EPISODES_LIMIT = config('FEED_EPISODES_LIMIT', default=30, cast=int)
+# "stream" writes RSS directly, "feedgen" builds it through feedgen
+FEED_WRITER = config('FEED_WRITER', default='stream')
+FEED_PRETTY = config('FEED_PRETTY', default=True, cast=bool)
+
+
+# Program cover art
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+GM_IMAGE_WEBP = config('GM_IMAGE_WEBP', default=False, cast=bool)
+
+
+# Metrics
+# Management commands dump their metrics to METRICS_DIR/<command>.json and
+# /metrics/ serves them together with the web process metrics.
+METRICS_DIR = config(
+    'METRICS_DIR',
+    default=os.path.join(BASE_DIR, 'cache', 'metrics'),
+)
+
+
+# Station adapters
+# Every station is scraped by the adapter registered for its
+# short_latin_name. Adding a station means adding its adapter class here.
+STATION_ADAPTERS = config(
+    'STATION_ADAPTERS',
+    default='rsser.gm.GmAdapter',
+    cast=Csv(),
+)
+
+
+# Scheduler
+# run_scheduler refreshes the program catalog and rebuilds due feeds on
+# these intervals, in seconds. Jobs and the cron commands take a file lock in
+# LOCKS_DIR, so the same job never runs twice at once.
+SCHEDULER_CATALOG_INTERVAL = config(
+    'SCHEDULER_CATALOG_INTERVAL', default=24 * 60 * 60, cast=int
+)
+SCHEDULER_FEEDS_INTERVAL = config(
+    'SCHEDULER_FEEDS_INTERVAL', default=15 * 60, cast=int
+)
+LOCKS_DIR = config(
+    'LOCKS_DIR',
+    default=os.path.join(BASE_DIR, 'cache', 'locks'),
+)
+
+
+# Adaptive refresh
+# Every program is scraped again when its next_refresh comes, planned from
+# the weekdays, hours and gaps of its last REFRESH_HISTORY episodes: often
+# around an expected publication, rarely otherwise. In seconds.
+REFRESH_MIN_INTERVAL = config(
+    'REFRESH_MIN_INTERVAL', default=60 * 60, cast=int
+)
+REFRESH_MAX_INTERVAL = config(
+    'REFRESH_MAX_INTERVAL', default=7 * 24 * 60 * 60, cast=int
+)
+REFRESH_HISTORY = config('REFRESH_HISTORY', default=30, cast=int)
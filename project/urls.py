@@ -20,5 +20,11 @@ from rsser import views
 
 urlpatterns = [
     path('', views.index),
+    path(
+        'feeds/<slug:station>/<slug:program>.xml',
+        views.feed,
+        name='feed',
+    ),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
 ]
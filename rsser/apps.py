@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class RsserConfig(AppConfig):
     name = 'rsser'
+
+    def ready(self):
+        from rsser import signals, stations
+
+        stations.load_adapters()
@@ -0,0 +1,188 @@
+from typing import Optional
+
+MPEG_1 = 3
+MPEG_2 = 2
+MPEG_2_5 = 0
+
+LAYER_1 = 3
+LAYER_2 = 2
+LAYER_3 = 1
+
+# kbit/s, indexed by the 4-bit bitrate index (0 is "free", 15 is invalid)
+BITRATES = {
+    (MPEG_1, LAYER_1): (
+        0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448,
+    ),
+    (MPEG_1, LAYER_2): (
+        0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384,
+    ),
+    (MPEG_1, LAYER_3): (
+        0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320,
+    ),
+    (MPEG_2, LAYER_1): (
+        0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256,
+    ),
+    (MPEG_2, LAYER_2): (
+        0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160,
+    ),
+    (MPEG_2, LAYER_3): (
+        0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160,
+    ),
+}
+
+SAMPLE_RATES = {
+    MPEG_1: (44100, 48000, 32000),
+    MPEG_2: (22050, 24000, 16000),
+    MPEG_2_5: (11025, 12000, 8000),
+}
+
+MONO = 3
+
+
+class FrameHeader:
+    def __init__(self, data: bytes, position: int):
+        b1, b2, b3 = data[position + 1], data[position + 2], data[position + 3]
+
+        self.position = position
+        self.version = (b1 >> 3) & 0b11
+        self.layer = (b1 >> 1) & 0b11
+        self.bitrate_index = b2 >> 4
+        self.sample_rate_index = (b2 >> 2) & 0b11
+        self.padding = (b2 >> 1) & 0b1
+        self.channel_mode = b3 >> 6
+
+    @property
+    def is_valid(self) -> bool:
+        return (
+            self.version != 1
+            and self.layer != 0
+            and self.bitrate_index not in (0, 15)
+            and self.sample_rate_index != 3
+        )
+
+    @property
+    def bitrate(self) -> int:
+        table_version = MPEG_1 if self.version == MPEG_1 else MPEG_2
+        table = BITRATES[(table_version, self.layer)]
+
+        return table[self.bitrate_index] * 1000
+
+    @property
+    def sample_rate(self) -> int:
+        return SAMPLE_RATES[self.version][self.sample_rate_index]
+
+    @property
+    def samples_per_frame(self) -> int:
+        if self.layer == LAYER_1:
+            return 384
+        if self.layer == LAYER_3 and self.version != MPEG_1:
+            return 576
+        return 1152
+
+    @property
+    def frame_length(self) -> int:
+        if self.layer == LAYER_1:
+            return (12 * self.bitrate // self.sample_rate + self.padding) * 4
+
+        slot_bytes = self.samples_per_frame // 8
+
+        return slot_bytes * self.bitrate // self.sample_rate + self.padding
+
+    @property
+    def xing_offset(self) -> int:
+        # Header (4 bytes) plus the Layer III side information block
+        if self.version == MPEG_1:
+            side_info = 17 if self.channel_mode == MONO else 32
+        else:
+            side_info = 9 if self.channel_mode == MONO else 17
+
+        return self.position + 4 + side_info
+
+    @property
+    def vbri_offset(self) -> int:
+        return self.position + 4 + 32
+
+
+def id3v2_size(data: bytes) -> int:
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+
+    # Tag size is a 28-bit "syncsafe" integer: 7 significant bits per byte
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+
+    footer_present = data[5] & 0x10
+
+    return 10 + size + (10 if footer_present else 0)
+
+
+def is_frame_sync(data: bytes, position: int) -> bool:
+    return data[position] == 0xff and data[position + 1] & 0xe0 == 0xe0
+
+
+def find_frame_header(data: bytes) -> Optional[FrameHeader]:
+    position = 0
+
+    while position + 4 <= len(data):
+        if not is_frame_sync(data, position):
+            position += 1
+            continue
+
+        header = FrameHeader(data, position)
+
+        if not header.is_valid:
+            position += 1
+            continue
+
+        # Guard against false syncs inside garbage by checking the next frame
+        next_position = position + header.frame_length
+        next_is_available = next_position + 4 <= len(data)
+
+        if next_is_available and not is_frame_sync(data, next_position):
+            position += 1
+            continue
+
+        return header
+
+    return None
+
+
+def vbr_frames_count(data: bytes, header: FrameHeader) -> Optional[int]:
+    xing = header.xing_offset
+    tag = data[xing:xing + 4]
+
+    if tag in (b'Xing', b'Info') and len(data) >= xing + 12:
+        flags = int.from_bytes(data[xing + 4:xing + 8], 'big')
+        if flags & 0x1:
+            return int.from_bytes(data[xing + 8:xing + 12], 'big')
+
+    vbri = header.vbri_offset
+
+    if data[vbri:vbri + 4] == b'VBRI' and len(data) >= vbri + 18:
+        return int.from_bytes(data[vbri + 14:vbri + 18], 'big')
+
+    return None
+
+
+def mp3_duration(
+        data: bytes,
+        file_size: int,
+        offset: int = 0) -> Optional[float]:
+
+    header = find_frame_header(data)
+
+    if not header:
+        return None
+
+    frames = vbr_frames_count(data, header)
+
+    if frames:
+        return frames * header.samples_per_frame / header.sample_rate
+
+    audio_size = file_size - offset - header.position
+
+    if audio_size <= 0:
+        return None
+
+    return audio_size * 8 / header.bitrate
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rsser.models import Program
+from rsser.utils import write_file_atomic
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when a client accepts several encodings
+ENCODING_SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+
+class CachedFeed(NamedTuple):
+    content: bytes
+    etag: str
+    last_modified: Optional[float]
+    encoded: Dict[str, bytes] = {}
+
+    def variant_etag(self, encoding: str) -> str:
+        return f'{self.etag[:-1]}-{encoding}"'
+
+
+def feed_path(station_slug: str, program_slug: str) -> str:
+    return os.path.join(
+        settings.FEEDS_DIR,
+        station_slug,
+        f'{program_slug}.xml',
+    )
+
+
+def feed_cache_key(station_slug: str, program_slug: str) -> str:
+    return f'rsser:feed:{station_slug}:{program_slug}'
+
+
+INDEX_CACHE_KEY = 'rsser:index'
+
+
+def content_etag(content: bytes) -> str:
+    return f'"{hashlib.sha256(content).hexdigest()}"'
+
+
+def compress_feed(content: bytes) -> Dict[str, bytes]:
+    # mtime=0 keeps the gzip output identical for identical feeds
+    encoded = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+
+    if brotli is not None:
+        encoded['br'] = brotli.compress(content, quality=11)
+
+    return encoded
+
+
+def write_feed_files(path: str, content: bytes) -> Dict[str, bytes]:
+    encoded = compress_feed(content)
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if encoding in encoded:
+            write_file_atomic(path + suffix, encoded[encoding])
+            continue
+
+        # Left from a run that could produce it (brotli uninstalled
+        # since), it would keep serving the old feed
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+    write_file_atomic(path, content)
+
+    return encoded
+
+
+def read_feed_files(path: str) -> Optional[tuple]:
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+
+    encoded = {}
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        try:
+            with open(path + suffix, 'rb') as f:
+                encoded[encoding] = f.read()
+        except FileNotFoundError:
+            continue
+
+    return content, encoded
+
+
+def preferred_encoding(
+        accept_encoding: str,
+        available: Iterable[str]) -> Optional[str]:
+
+    accepted = {}
+
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in ENCODING_SUFFIXES:
+        if encoding in available and accepted.get(encoding, 0) > 0:
+            return encoding
+
+    return None
+
+
+def store_feed(
+        station_slug: str,
+        program_slug: str,
+        content: bytes,
+        feed_updated: Optional[datetime],
+        encoded: Dict[str, bytes] = None) -> CachedFeed:
+
+    last_modified = None
+    if feed_updated:
+        # Whole seconds like HTTP dates, or If-Modified-Since never matches
+        last_modified = int(feed_updated.timestamp())
+
+    cached_feed = CachedFeed(
+        content,
+        content_etag(content),
+        last_modified,
+        encoded or {},
+    )
+
+    cache.set(
+        feed_cache_key(station_slug, program_slug),
+        cached_feed,
+        settings.FEED_CACHE_TIMEOUT,
+    )
+
+    return cached_feed
+
+
+def load_feed(station_slug: str, program_slug: str) -> Optional[CachedFeed]:
+    cached_feed = cache.get(feed_cache_key(station_slug, program_slug))
+
+    if cached_feed:
+        return cached_feed
+
+    path = feed_path(station_slug, program_slug)
+    feed_files = read_feed_files(path)
+
+    if feed_files is None:
+        return None
+
+    content, encoded = feed_files
+
+    feed_updated = (
+        Program.objects
+        .filter(
+            station__short_latin_name=station_slug,
+            title_en=program_slug,
+        )
+        .values_list('feed_updated', flat=True)
+        .first()
+    )
+
+    # Feeds written before feed_updated was kept: files are only rewritten
+    # when their content changes, so their mtime says the same
+    if feed_updated is None:
+        feed_updated = datetime.fromtimestamp(
+            os.path.getmtime(path),
+            timezone.utc,
+        )
+
+    return store_feed(
+        station_slug,
+        program_slug,
+        content,
+        feed_updated,
+        encoded,
+    )
+
+
+def load_index_page() -> Optional[str]:
+    return cache.get(INDEX_CACHE_KEY)
+
+
+def store_index_page(content: str) -> None:
+    cache.set(INDEX_CACHE_KEY, content, settings.INDEX_CACHE_TIMEOUT)
+
+
+def invalidate_index_page() -> None:
+    cache.delete(INDEX_CACHE_KEY)
@@ -0,0 +1,101 @@
+import statistics
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import FrozenSet, NamedTuple, Optional, Sequence
+
+# Share of episodes a weekday needs to count as a publication day, so an
+# occasional special does not turn a weekly show into a daily one
+WEEKDAY_SHARE = 0.1
+# How early polling starts before an expected publication, and how long
+# it goes on after one that has a known hour
+WINDOW_BEFORE = timedelta(hours=1)
+WINDOW_AFTER = timedelta(hours=3)
+# Cadence of programs with too little history to learn from
+UNKNOWN_CADENCE_INTERVAL = timedelta(days=1)
+
+
+class Cadence(NamedTuple):
+    last: datetime
+    min_gap: timedelta
+    weekdays: FrozenSet[int]
+    # None when the station only publishes dates
+    hour: Optional[int]
+
+
+def learn_cadence(dates: Sequence[datetime]) -> Optional[Cadence]:
+    dates = sorted(set(dates), reverse=True)
+
+    if len(dates) < 2:
+        return None
+
+    gaps = [newer - older for newer, older in zip(dates, dates[1:])]
+
+    weekday_counts = Counter(day.weekday() for day in dates)
+    weekdays = frozenset(
+        weekday
+        for weekday, count in weekday_counts.items()
+        if count >= len(dates) * WEEKDAY_SHARE
+    )
+
+    dates_only = all(
+        day.hour == 0 and day.minute == 0
+        for day
+        in dates
+    )
+    hour = None if dates_only else statistics.median_low(
+        day.hour for day in dates
+    )
+
+    # The shortest gap rather than the mean: polling a day early costs a
+    # few requests, polling a day late delays the episode
+    return Cadence(dates[0], min(gaps), weekdays, hour)
+
+
+def next_publication(cadence: Cadence) -> datetime:
+    expected = cadence.last + max(cadence.min_gap, timedelta(days=1))
+    expected = expected.replace(minute=0, second=0, microsecond=0)
+
+    if cadence.hour is None:
+        expected = expected.replace(hour=0)
+    else:
+        expected = expected.replace(hour=cadence.hour)
+
+    for _ in range(7):
+        if expected.weekday() in cadence.weekdays:
+            break
+        expected += timedelta(days=1)
+
+    return expected
+
+
+def next_refresh(
+        dates: Sequence[datetime],
+        now: datetime,
+        min_interval: timedelta,
+        max_interval: timedelta) -> datetime:
+
+    def clamp(interval: timedelta) -> datetime:
+        return now + min(max(interval, min_interval), max_interval)
+
+    cadence = learn_cadence(dates)
+
+    if cadence is None:
+        return clamp(UNKNOWN_CADENCE_INTERVAL)
+
+    expected = next_publication(cadence)
+    window_start = expected - WINDOW_BEFORE
+
+    if cadence.hour is None:
+        window_end = expected + timedelta(days=1)
+    else:
+        window_end = expected + WINDOW_AFTER
+
+    if now < window_start:
+        return min(window_start, clamp(window_start - now))
+
+    if now <= window_end:
+        return clamp(min_interval)
+
+    # Overdue: the longer a program has been silent, the less often it is
+    # checked, down to max_interval for programs that stopped airing
+    return clamp((now - window_end) / 2)
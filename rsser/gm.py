@@ -0,0 +1,26 @@
+from rsser.models import Program, Station
+from rsser.stations import StationAdapter
+from rsser.utils import prepare_gm_image
+
+
+class GmAdapter(StationAdapter):
+    short_latin_name = 'gm'
+    hosts = ('govoritmoskva.ru',)
+    rate_limit = 0.5
+    rate_burst = 1
+    max_concurrency = 2
+
+    # Adapters are loaded by every process, the scraper only by those
+    # that use it
+    def update_programs(self, station: Station) -> None:
+        from rsser.parsers import update_gm_programs
+
+        update_gm_programs(station)
+
+    def build_feed(self, program: Program, **options) -> bool:
+        from rsser.parsers import build_gm_feed
+
+        return build_gm_feed(program, **options)
+
+    def prepare_image(self, program: Program) -> str:
+        return prepare_gm_image(program.title_ru, program.title_en)
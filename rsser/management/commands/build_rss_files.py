@@ -1,8 +1,60 @@
+from argparse import ArgumentTypeError
+
 from django.core.management.base import BaseCommand
 
+from rsser.management.reporting import report_results
 from rsser.parsers import build_rss_files
+from rsser.scheduler import job_lock
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+
+    if number < 1:
+        raise ArgumentTypeError(f'{value} is not a positive number')
+
+    return number
 
 
 class Command(BaseCommand):
+    help = 'Scrape episodes and rebuild the RSS feeds of all programs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes building programs in parallel',
+        )
+        parser.add_argument(
+            '--backfill-months',
+            type=positive_int,
+            default=None,
+            help='Collect every episode of the given number of past months',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Build every program, not only those due for a refresh',
+        )
+
     def handle(self, *args, **options):
-        build_rss_files()
+        with job_lock('feeds') as locked:
+            if not locked:
+                self.stderr.write('Feeds are being built already, skipping')
+                return
+
+            # A backfill is meant for every program
+            results = build_rss_files(
+                workers=options['workers'],
+                force=options['force'] or bool(options['backfill_months']),
+                backfill_months=options['backfill_months'],
+            )
+
+        report_results(
+            self,
+            'build_rss_files',
+            results,
+            options['verbosity'],
+            'build',
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from rsser.management.reporting import report_results
+from rsser.parsers import render_feeds
+from rsser.scheduler import job_lock
+
+
+class Command(BaseCommand):
+    help = 'Render the RSS feeds of all programs from stored episodes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rewrite feeds even if their content did not change',
+        )
+
+    def handle(self, *args, **options):
+        with job_lock('feeds') as locked:
+            if not locked:
+                self.stderr.write('Feeds are being built already, skipping')
+                return
+
+            results = render_feeds(force=options['force'])
+
+        report_results(
+            self,
+            'render_feeds',
+            results,
+            options['verbosity'],
+            'render',
+        )
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rsser.parsers import (
+    build_rss_files,
+    ping_build_pool,
+    start_build_pool,
+    update_programs,
+)
+from rsser.scheduler import Job, Scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        'Stay resident, refreshing the program catalog and rebuilding '
+        'feeds on their own intervals until SIGTERM'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes building programs in parallel',
+        )
+        parser.add_argument(
+            '--catalog-interval',
+            type=int,
+            default=settings.SCHEDULER_CATALOG_INTERVAL,
+            help='Seconds between program catalog refreshes',
+        )
+        parser.add_argument(
+            '--feeds-interval',
+            type=int,
+            default=settings.SCHEDULER_FEEDS_INTERVAL,
+            help='Seconds between feed rebuilds',
+        )
+
+    def build_feeds(self) -> None:
+        # A worker killed during a run breaks the whole pool, the next
+        # run gets a new one instead of failing until a restart
+        if self.executor is not None and not ping_build_pool(self.executor):
+            self.stderr.write('Build pool is broken, starting a new one')
+            self.executor.shutdown(wait=False)
+            self.executor = start_build_pool(self.workers)
+
+        build_rss_files(executor=self.executor)
+
+    def handle(self, *args, **options):
+        self.workers = options['workers']
+        self.executor = None
+
+        if self.workers > 1:
+            # Started once and kept warm: workers keep their HTTP sessions
+            # and parsed pages between runs
+            self.executor = start_build_pool(self.workers)
+
+        scheduler = Scheduler([
+            Job('catalog', options['catalog_interval'], update_programs),
+            Job('feeds', options['feeds_interval'], self.build_feeds),
+        ])
+
+        try:
+            scheduler.run()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+
+        self.stdout.write('Scheduler stopped')
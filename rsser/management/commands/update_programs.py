@@ -1,8 +1,20 @@
 from django.core.management.base import BaseCommand
 
+from rsser import metrics
 from rsser.parsers import update_programs
+from rsser.scheduler import job_lock
 
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
-        update_programs()
+        with job_lock('catalog') as locked:
+            if not locked:
+                self.stderr.write('Programs are being updated, skipping')
+                return
+
+            update_programs()
+
+        metrics.dump('update_programs')
+
+        for line in metrics.summary():
+            self.stdout.write(line)
@@ -0,0 +1,38 @@
+from typing import TYPE_CHECKING, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rsser import metrics
+
+if TYPE_CHECKING:
+    from rsser.parsers import BuildResult
+
+
+def report_results(
+        command: BaseCommand,
+        process: str,
+        results: List['BuildResult'],
+        verbosity: int,
+        action: str) -> None:
+
+    failed = [result for result in results if result.error]
+    changed = [result for result in results if result.changed]
+
+    metrics.dump(process)
+
+    # Per-program series are only listed with --verbosity 2
+    verbose = verbosity > 1
+    for line in metrics.summary(() if verbose else ('program',)):
+        command.stdout.write(line)
+
+    for result in failed:
+        command.stderr.write(f'{result.program}: {result.error}')
+
+    command.stdout.write(
+        f'Programs: {len(results)}, '
+        f'changed: {len(changed)}, '
+        f'failed: {len(failed)}'
+    )
+
+    if failed:
+        raise CommandError(f'{len(failed)} programs failed to {action}')
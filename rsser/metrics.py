@@ -0,0 +1,323 @@
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from django.conf import settings
+
+from rsser.utils import write_file_atomic
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+_registry: Dict[str, 'Metric'] = {}
+
+
+class Metric:
+    kind = ''
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: Sequence[str] = ()):
+
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+        _registry[name] = self
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.values.clear()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            values = [[list(key), value] for key, value in self.values.items()]
+
+        return {
+            'kind': self.kind,
+            'help': self.documentation,
+            'labels': list(self.labels),
+            'values': values,
+        }
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self.key(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def merge(self, values: list) -> None:
+        with self.lock:
+            for key, value in values:
+                key = tuple(key)
+                self.values[key] = self.values.get(key, 0.0) + value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS):
+
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+
+        with self.lock:
+            counts, total, count = self.values.get(
+                key, ([0] * len(self.buckets), 0.0, 0),
+            )
+            counts = [
+                bucket_count + (value <= bound)
+                for bucket_count, bound
+                in zip(counts, self.buckets)
+            ]
+            self.values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, values: list) -> None:
+        with self.lock:
+            for key, (counts, total, count) in values:
+                key = tuple(key)
+                old_counts, old_total, old_count = self.values.get(
+                    key, ([0] * len(self.buckets), 0.0, 0),
+                )
+                self.values[key] = (
+                    [a + b for a, b in zip(old_counts, counts)],
+                    old_total + total,
+                    old_count + count,
+                )
+
+    def snapshot(self) -> dict:
+        snapshot = super().snapshot()
+        snapshot['buckets'] = list(self.buckets)
+
+        return snapshot
+
+
+HTTP_REQUESTS = Counter(
+    'rsser_http_requests_total',
+    'HTTP requests made by the scraper',
+    ['host', 'status'],
+)
+HTTP_RESPONSE_BYTES = Counter(
+    'rsser_http_response_bytes_total',
+    'Response bytes announced by Content-Length or read by the scraper',
+    ['host'],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'rsser_http_request_seconds',
+    'Time until a response (headers only for streamed responses)',
+    ['host'],
+)
+THROTTLE_SECONDS = Counter(
+    'rsser_throttle_seconds_total',
+    'Time spent waiting for the per-host rate limit',
+    ['host'],
+)
+HTML_PARSE_SECONDS = Histogram(
+    'rsser_html_parse_seconds',
+    'Time spent building BeautifulSoup trees',
+)
+AUDIO_PROBE_SECONDS = Histogram(
+    'rsser_audio_probe_seconds',
+    'Time spent reading duration and size of an episode file',
+    ['method'],
+)
+EPISODE_RECORDS = Counter(
+    'rsser_episode_records_total',
+    'Episode file lookups answered by EpisodeRecord (hit) or the network',
+    ['result'],
+)
+FEED_WRITE_SECONDS = Histogram(
+    'rsser_feed_write_seconds',
+    'Time spent rendering and writing a changed feed',
+)
+PROGRAM_BUILDS = Counter(
+    'rsser_program_builds_total',
+    'Program feed builds by outcome',
+    ['result'],
+)
+PROGRAM_BUILD_SECONDS = Histogram(
+    'rsser_program_build_seconds',
+    'Time spent building the feed of one program',
+    buckets=(1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+PROGRAM_SECONDS = Counter(
+    'rsser_program_seconds_total',
+    'Time spent building the feed of each program',
+    ['program'],
+)
+SCHEDULER_RUNS = Counter(
+    'rsser_scheduler_runs_total',
+    'Scheduler job runs by outcome',
+    ['job', 'result'],
+)
+FEED_RESPONSES = Counter(
+    'rsser_feed_responses_total',
+    'Feed responses served by the web process',
+    ['status', 'encoding'],
+)
+
+
+def snapshot() -> Dict[str, dict]:
+    return {name: metric.snapshot() for name, metric in _registry.items()}
+
+
+def merge(other: Dict[str, dict]) -> None:
+    for name, metric_snapshot in other.items():
+        metric = _registry.get(name)
+
+        if metric is not None:
+            metric.merge(metric_snapshot['values'])
+
+
+def reset() -> None:
+    for metric in _registry.values():
+        metric.reset()
+
+
+def dump_path(process: str) -> str:
+    return os.path.join(settings.METRICS_DIR, f'{process}.json')
+
+
+def dump(process: str) -> None:
+    data = json.dumps(snapshot(), ensure_ascii=False).encode('utf-8')
+    write_file_atomic(dump_path(process), data)
+
+
+def load_dumps() -> Dict[str, Dict[str, dict]]:
+    dumps = {}
+
+    for path in sorted(glob.glob(dump_path('*'))):
+        process = os.path.splitext(os.path.basename(path))[0]
+
+        try:
+            with open(path) as f:
+                dumps[process] = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+    return dumps
+
+
+def samples(metric_snapshot: dict) -> Iterator[Sample]:
+    labels = metric_snapshot['labels']
+
+    for key, value in metric_snapshot['values']:
+        series = dict(zip(labels, key))
+
+        if metric_snapshot['kind'] != 'histogram':
+            yield '', series, value
+            continue
+
+        counts, total, count = value
+
+        for bound, bucket_count in zip(metric_snapshot['buckets'], counts):
+            yield '_bucket', {**series, 'le': repr(float(bound))}, bucket_count
+        yield '_bucket', {**series, 'le': '+Inf'}, count
+        yield '_sum', series, total
+        yield '_count', series, count
+
+
+def escape_label(value: str) -> str:
+    return (
+        value
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+
+    pairs = ','.join(
+        f'{name}="{escape_label(value)}"'
+        for name, value
+        in labels.items()
+    )
+
+    return f'{{{pairs}}}'
+
+
+def render_text(sources: Dict[str, Dict[str, dict]]) -> str:
+    lines = []
+    names = sorted({name for source in sources.values() for name in source})
+
+    for name in names:
+        header_written = False
+
+        for process, source in sources.items():
+            if name not in source:
+                continue
+
+            metric_snapshot = source[name]
+
+            if not header_written:
+                lines.append(f'# HELP {name} {metric_snapshot["help"]}')
+                lines.append(f'# TYPE {name} {metric_snapshot["kind"]}')
+                header_written = True
+
+            for suffix, labels, value in samples(metric_snapshot):
+                labels = {'process': process, **labels}
+                lines.append(f'{name}{suffix}{format_labels(labels)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def summary(exclude_labels: Sequence[str] = ()) -> List[str]:
+    lines = []
+
+    for name, metric_snapshot in snapshot().items():
+        if set(exclude_labels) & set(metric_snapshot['labels']):
+            continue
+
+        for key, value in sorted(metric_snapshot['values']):
+            series = dict(zip(metric_snapshot['labels'], key))
+            title = f'{name}{format_labels(series)}'
+
+            if metric_snapshot['kind'] == 'histogram':
+                _, total, count = value
+                mean = total / count if count else 0.0
+                lines.append(
+                    f'{title}: {count} in {total:.2f} s, '
+                    f'mean {mean * 1000:.1f} ms'
+                )
+            else:
+                lines.append(f'{title}: {value:g}')
+
+    return lines
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsser', '0005_siteuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='feed_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='program',
+            name='status',
+            field=models.CharField(choices=[('new', 'New'), ('current', 'Current'), ('archive', 'Archive')], max_length=10),
+        ),
+    ]
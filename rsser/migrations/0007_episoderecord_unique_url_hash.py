@@ -0,0 +1,41 @@
+# Generated by Django 3.2.13 on 2026-10-18 08:06
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_records(apps, schema_editor):
+    EpisodeRecord = apps.get_model('rsser', 'EpisodeRecord')
+
+    duplicates = (
+        EpisodeRecord.objects
+        .values('url_hash')
+        .annotate(records=Count('id'), first_id=Min('id'))
+        .filter(records__gt=1)
+    )
+
+    for duplicate in duplicates:
+        EpisodeRecord.objects.filter(
+            url_hash=duplicate['url_hash'],
+        ).exclude(
+            id=duplicate['first_id'],
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsser', '0006_program_feed_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_records,
+            migrations.RunPython.noop,
+        ),
+        migrations.AlterField(
+            model_name='episoderecord',
+            name='url_hash',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsser', '0007_episoderecord_unique_url_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='program',
+            name='title_ru',
+            field=models.CharField(db_index=True, max_length=200, verbose_name='name_ru'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsser', '0008_program_title_ru_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='last_episode_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
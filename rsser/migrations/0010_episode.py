@@ -0,0 +1,37 @@
+# Generated by Django 3.2.13 on 2026-10-18 08:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsser', '0009_program_last_episode_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Episode',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guid', models.CharField(max_length=64)),
+                ('date', models.DateTimeField()),
+                ('title', models.CharField(max_length=500)),
+                ('description', models.TextField(blank=True)),
+                ('duration', models.IntegerField()),
+                ('guests', models.JSONField(blank=True, default=list)),
+                ('file_name', models.CharField(max_length=200)),
+                ('file_url', models.URLField(max_length=500)),
+                ('file_size', models.IntegerField()),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='episodes', to='rsser.program')),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='episode',
+            constraint=models.UniqueConstraint(fields=('program', 'guid'), name='unique_program_episode'),
+        ),
+    ]
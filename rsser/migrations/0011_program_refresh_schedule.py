@@ -0,0 +1,23 @@
+# Generated by Django 3.2.13 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsser', '0010_episode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='last_scraped',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='next_refresh',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rsser', '0011_program_refresh_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='feed_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
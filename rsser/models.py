@@ -1,7 +1,3 @@
-from dataclasses import dataclass
-from datetime import datetime
-from typing import List
-
 from django.db import models
 
 
@@ -44,13 +40,18 @@ class Program(models.Model):
         ('archive', 'Archive'),
     )
 
-    title_ru = models.CharField('name_ru', max_length=200)
+    title_ru = models.CharField('name_ru', max_length=200, db_index=True)
     title_en = models.CharField('name_en', max_length=200)
     description = models.CharField(max_length=300)
     url = models.URLField()
     feed_url = models.URLField()
     image_path = models.URLField()
     status = models.CharField(max_length=10, choices=STATUSES)
+    feed_fingerprint = models.CharField(max_length=64, blank=True, default='')
+    last_episode_date = models.DateTimeField(blank=True, null=True)
+    feed_updated = models.DateTimeField(blank=True, null=True)
+    last_scraped = models.DateTimeField(blank=True, null=True)
+    next_refresh = models.DateTimeField(blank=True, null=True, db_index=True)
     hosts = models.ManyToManyField(Host, related_name='programs')
     station = models.ForeignKey(
         Station,
@@ -64,7 +65,7 @@ class Program(models.Model):
 
 class EpisodeRecord(models.Model):
     url = models.URLField()
-    url_hash = models.CharField(max_length=200)
+    url_hash = models.CharField(max_length=200, unique=True)
     duration = models.IntegerField()
     size = models.IntegerField()
     added = models.DateField(auto_now_add=True)
@@ -78,13 +79,30 @@ class SiteUser(models.Model):
         return self.email
 
 
-@dataclass
-class Episode:
-    date: datetime
-    title: str
-    description: str
-    duration: int
-    guests: List[dict]
-    file_name: str
-    file_url: str
-    file_size: int
+class Episode(models.Model):
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['program', 'guid'],
+                name='unique_program_episode',
+            ),
+        ]
+
+    program = models.ForeignKey(
+        Program,
+        on_delete=models.CASCADE,
+        related_name='episodes',
+    )
+    guid = models.CharField(max_length=64)
+    date = models.DateTimeField()
+    title = models.CharField(max_length=500)
+    description = models.TextField(blank=True)
+    duration = models.IntegerField()
+    guests = models.JSONField(default=list, blank=True)
+    file_name = models.CharField(max_length=200)
+    file_url = models.URLField(max_length=500)
+    file_size = models.IntegerField()
+
+    def __str__(self):
+        return self.title
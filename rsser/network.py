@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.exceptions import InvalidURL
+from urllib3.util.retry import Retry
+
+from rsser import metrics
+from rsser.utils import write_file_atomic
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+            # Going below zero queues the caller behind earlier reservations
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.rate
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+_rate_scale = 1.0
+# Limits declared by station adapters, with the share of each process
+_declared_limits: Dict[str, Tuple[float, int]] = {}
+_declared_scales: Dict[str, float] = {}
+
+
+def scale_rate_limits(factor: float) -> None:
+    global _rate_scale
+
+    with _buckets_lock:
+        _rate_scale = factor
+        _buckets.clear()
+
+
+def declare_host_rate_limit(
+        host: str,
+        rate: float,
+        burst: int,
+        scale: float = None) -> None:
+
+    with _buckets_lock:
+        _declared_limits[host] = (rate, burst)
+        if scale is None:
+            _declared_scales.pop(host, None)
+        else:
+            _declared_scales[host] = scale
+        _buckets.pop(host, None)
+
+
+def host_rate_limit(host: str) -> Tuple[float, int]:
+    default = _declared_limits.get(
+        host,
+        (settings.SCRAPER_RATE_LIMIT, settings.SCRAPER_RATE_BURST),
+    )
+    # Limits from the settings always win over what adapters declare
+    rate, burst = settings.SCRAPER_HOST_RATE_LIMITS.get(host, default)
+    scale = _declared_scales.get(host, _rate_scale)
+
+    # The burst is shared like the rate, but every process keeps at least
+    # one request, or its bucket would never let anything through
+    return rate * scale, max(int(burst * scale), 1)
+
+
+def host_bucket(host: str) -> TokenBucket:
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+
+        if bucket is None:
+            rate, burst = host_rate_limit(host)
+            bucket = _buckets[host] = TokenBucket(rate, burst)
+
+    return bucket
+
+
+def throttle(url: str) -> float:
+    host = urlsplit(url).hostname or ''
+    wait = host_bucket(host).acquire()
+
+    if wait:
+        metrics.THROTTLE_SECONDS.inc(wait, host=host)
+
+    return wait
+
+
+class JitterRetry(Retry):
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+
+        # Spread retries of parallel workers instead of retrying in lockstep
+        return backoff * random.uniform(0.5, 1.5)
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def build_session() -> requests.Session:
+    retry = JitterRetry(
+        total=settings.SCRAPER_RETRIES,
+        backoff_factor=settings.SCRAPER_BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.SCRAPER_POOL_CONNECTIONS,
+        pool_maxsize=settings.SCRAPER_POOL_SIZE,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+
+    return _session
+
+
+def reset_session() -> None:
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def response_size(response: requests.Response, streamed: bool) -> int:
+    content_length = response.headers.get('Content-Length', '')
+
+    if content_length.isdigit():
+        return int(content_length)
+
+    # Reading the body here would defeat streaming
+    if streamed:
+        return 0
+
+    return len(response.content)
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    throttle(url)
+    kwargs.setdefault('timeout', settings.SCRAPER_TIMEOUT)
+
+    host = urlsplit(url).hostname or ''
+    started = time.perf_counter()
+
+    try:
+        response = get_session().get(url, **kwargs)
+    except requests.RequestException:
+        metrics.HTTP_REQUESTS.inc(host=host, status='error')
+        raise
+
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        host=host,
+    )
+    metrics.HTTP_REQUESTS.inc(host=host, status=response.status_code)
+    metrics.HTTP_RESPONSE_BYTES.inc(
+        response_size(response, kwargs.get('stream', False)),
+        host=host,
+    )
+
+    return response
+
+
+class PageResponse(NamedTuple):
+    url: str
+    content: bytes
+    validator: str
+    not_modified: bool
+
+
+def cache_paths(url: str) -> Tuple[str, str]:
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    base = os.path.join(settings.HTTP_CACHE_DIR, key[:2], key)
+
+    return f'{base}.json', f'{base}.body'
+
+
+def read_cached_page(url: str) -> Optional[dict]:
+    meta_path, body_path = cache_paths(url)
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            meta['content'] = f.read()
+    except (OSError, ValueError):
+        return None
+
+    return meta
+
+
+def store_cached_page(url: str, response: requests.Response) -> str:
+    meta = {
+        'etag': response.headers.get('ETag', ''),
+        'last_modified': response.headers.get('Last-Modified', ''),
+    }
+
+    if not any(meta.values()):
+        return ''
+
+    meta_path, body_path = cache_paths(url)
+    write_file_atomic(body_path, response.content)
+    write_file_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+    return validator(meta)
+
+
+def validator(meta: dict) -> str:
+    return meta['etag'] or meta['last_modified']
+
+
+def fetch_page(url: str) -> PageResponse:
+    cached = read_cached_page(url) if settings.HTTP_CACHE else None
+    headers = {}
+
+    if cached and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached['last_modified']:
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    response = http_get(url, headers=headers)
+
+    if response.status_code == 304 and cached:
+        return PageResponse(url, cached['content'], validator(cached), True)
+
+    if response.status_code != 200:
+        raise InvalidURL(url)
+
+    page_validator = ''
+    if settings.HTTP_CACHE:
+        page_validator = store_cached_page(url, response)
+
+    return PageResponse(url, response.content, page_validator, False)
@@ -1,25 +1,78 @@
 import hashlib
+import logging
+import math
 import os
+import re
+import signal
+import tempfile
+import threading
 import time
-from datetime import date, datetime
-from typing import List, Optional
-
-import dateparser
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+from functools import lru_cache, partial
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import django
 import pytz
 import requests
-from bs4 import BeautifulSoup, ResultSet, Tag
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 from decouple import config
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db import connection, connections, transaction
+from django.db.models import Q
 from django.template.loader import get_template
-from feedgen.entry import FeedEntry
-from feedgen.feed import FeedGenerator
-from requests.exceptions import InvalidURL
-from tinytag import TinyTag
-from transliterate import translit
-
+from django.utils import timezone
+from requests.exceptions import InvalidURL, RequestException
+
+from rsser import cadence, metrics, stations
+from rsser.audio import id3v2_size, mp3_duration
+from rsser.caching import (
+    feed_path,
+    invalidate_index_page,
+    store_feed,
+    write_feed_files,
+)
 from rsser.models import Station, Program, Episode, EpisodeRecord, SiteUser
-from rsser.utils import prepare_gm_image
+from rsser.network import (
+    fetch_page,
+    http_get,
+    reset_session,
+    scale_rate_limits,
+)
+from rsser.rss import itunes_duration, rss_bytes
+from rsser.utils import prepare_gm_images
+
+# dateparser, feedgen, tinytag and transliterate only serve fallbacks and
+# the catalog refresh, they are imported where used to keep startup fast
+if TYPE_CHECKING:
+    from feedgen.entry import FeedEntry
+    from feedgen.feed import FeedGenerator
+
+logger = logging.getLogger(__name__)
+
+# Every process that scrapes imports this module, the budgets the station
+# adapters ask for apply from here on
+stations.declare_rate_limits()
+
+# Bump to force every feed to be rewritten after changing the feed format
+FEED_FORMAT_VERSION = 1
+
+
+class BuildResult(NamedTuple):
+    program: str
+    changed: bool
+    error: Optional[str]
 
 
 def clean_gm_title(raw_title: str) -> str:
@@ -60,14 +113,45 @@ def clean_gm_description(raw_description: str) -> str:
     return cleaned_description
 
 
-def get_page_soup(url: str):
-    time.sleep(2)
-    response = requests.get(url)
+# Only the part of a page the parsers look at is turned into a tree
+GM_PROGRAMS_INDEX = SoupStrainer('div', {'id': 'programs'})
+GM_PROGRAM_PAGE = SoupStrainer('div', {'class': 'oneProgramPage'})
+
+_parsed_pages: 'OrderedDict[tuple, Tuple[str, BeautifulSoup]]' = OrderedDict()
+_parsed_pages_lock = threading.Lock()
 
-    if response.status_code != 200:
-        raise InvalidURL(url)
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+def parse_html(
+        content: bytes,
+        parse_only: SoupStrainer = None) -> BeautifulSoup:
+
+    with metrics.HTML_PARSE_SECONDS.time():
+        return BeautifulSoup(
+            content,
+            settings.HTML_PARSER,
+            parse_only=parse_only,
+        )
+
+
+def get_page_soup(url: str, parse_only: SoupStrainer = None):
+    page = fetch_page(url)
+    key = (url, parse_only)
+
+    # An unchanged page that was already parsed by this process is reused
+    with _parsed_pages_lock:
+        parsed = _parsed_pages.get(key)
+        if page.not_modified and parsed and parsed[0] == page.validator:
+            _parsed_pages.move_to_end(key)
+            return parsed[1]
+
+    soup = parse_html(page.content, parse_only)
+
+    if page.validator:
+        with _parsed_pages_lock:
+            _parsed_pages[key] = (page.validator, soup)
+            _parsed_pages.move_to_end(key)
+            while len(_parsed_pages) > settings.PARSED_PAGES_CACHE_SIZE:
+                _parsed_pages.popitem(last=False)
 
     return soup
 
@@ -90,43 +174,152 @@ def string_hash(string: str) -> str:
     return hashlib.md5(string.encode('utf-8')).hexdigest()
 
 
-def file_info(url: str, file_name: str) -> tuple:
-    url_hash = string_hash(url)
-    episode = EpisodeRecord.objects.filter(url_hash=url_hash).first()
+def content_total_size(response: requests.Response) -> Optional[int]:
+    content_range = response.headers.get('Content-Range', '')
 
-    if episode:
-        return episode.duration, episode.size
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[-1]
+        return int(total) if total.isdigit() else None
 
-    tmp_folder_name = 'uploads'
-    tmp_folder = os.path.join(settings.BASE_DIR, tmp_folder_name)
-    tmp_file = os.path.join(tmp_folder, file_name)
+    content_length = response.headers.get('Content-Length', '')
 
-    if not os.path.exists(tmp_folder):
-        os.mkdir(tmp_folder)
+    if response.status_code == 200 and content_length.isdigit():
+        return int(content_length)
+
+    return None
+
+
+def fetch_range(url: str, start: int, length: int) -> tuple:
+    headers = {'Range': f'bytes={start}-{start + length - 1}'}
+
+    with http_get(url, headers=headers, stream=True) as response:
+        if response.status_code not in (200, 206):
+            raise InvalidURL(url)
+
+        file_size = content_total_size(response)
+
+        # Server ignored the Range header: read the head and drop the rest
+        if response.status_code == 200 and start > 0:
+            return b'', file_size
+
+        data = b''
+        for chunk in response.iter_content(chunk_size=length):
+            data += chunk
+            if len(data) >= length:
+                break
+
+    return data[:length], file_size
 
-    time.sleep(2)
-    response = requests.get(url)
 
-    if not response.status_code == 200:
-        raise InvalidURL(url)
+def probe_file_info(url: str) -> Optional[tuple]:
+    probe_bytes = settings.AUDIO_PROBE_BYTES
+    data, file_size = fetch_range(url, 0, probe_bytes)
+
+    if not file_size:
+        return None
+
+    offset = id3v2_size(data)
+
+    # Large ID3 tags (embedded cover art) push the first frame out of reach
+    if offset + probe_bytes // 2 > len(data):
+        data, _ = fetch_range(url, offset, probe_bytes)
+    else:
+        data = data[offset:]
+
+    duration = mp3_duration(data, file_size, offset)
+
+    if duration is None:
+        return None
 
-    with open(tmp_file, 'wb') as f:
-        f.write(response.content)
+    return int(duration), file_size
 
-    tag = TinyTag.get(tmp_file)
 
-    EpisodeRecord.objects.create(
-        url=url,
-        url_hash=url_hash,
-        duration=tag.duration,
-        size=tag.filesize,
+def download_file_info(url: str, file_name: str) -> tuple:
+    tmp_folder_name = 'uploads'
+    tmp_folder = os.path.join(settings.BASE_DIR, tmp_folder_name)
+    os.makedirs(tmp_folder, exist_ok=True)
+
+    # TinyTag picks a parser by extension, so keep the original one
+    _, extension = os.path.splitext(file_name)
+    tmp_file = tempfile.NamedTemporaryFile(
+        dir=tmp_folder,
+        suffix=extension or '.mp3',
+        delete=False,
     )
 
-    os.remove(tmp_file)
+    try:
+        with tmp_file, http_get(url, stream=True) as response:
+            if not response.status_code == 200:
+                raise InvalidURL(url)
+
+            chunk_size = settings.DOWNLOAD_CHUNK_SIZE
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                tmp_file.write(chunk)
+
+        from tinytag import TinyTag
+
+        tag = TinyTag.get(tmp_file.name)
+    finally:
+        os.remove(tmp_file.name)
 
     return int(tag.duration), tag.filesize
 
 
+def episode_records(urls: Iterable[str]) -> Dict[str, tuple]:
+    hashes = {string_hash(url): url for url in urls}
+    url_hashes = list(hashes)
+    records = {}
+
+    # Chunked to stay below SQLite's limit of query parameters
+    batch_size = 500
+    for start in range(0, len(url_hashes), batch_size):
+        batch = EpisodeRecord.objects.filter(
+            url_hash__in=url_hashes[start:start + batch_size],
+        ).values_list('url_hash', 'duration', 'size')
+
+        for url_hash, duration, size in batch:
+            records[hashes[url_hash]] = (duration, size)
+
+    return records
+
+
+def file_info(
+        url: str,
+        file_name: str,
+        records: Dict[str, tuple] = None) -> tuple:
+
+    if records is None:
+        records = episode_records([url])
+
+    if url in records:
+        metrics.EPISODE_RECORDS.inc(result='hit')
+        return records[url]
+
+    metrics.EPISODE_RECORDS.inc(result='miss')
+    info = None
+
+    if settings.AUDIO_PROBE:
+        with metrics.AUDIO_PROBE_SECONDS.time(method='probe'):
+            info = probe_file_info(url)
+
+    if not info:
+        with metrics.AUDIO_PROBE_SECONDS.time(method='download'):
+            info = download_file_info(url, file_name)
+
+    duration, size = info
+
+    EpisodeRecord.objects.get_or_create(
+        url_hash=string_hash(url),
+        defaults={
+            'url': url,
+            'duration': duration,
+            'size': size,
+        },
+    )
+
+    return duration, size
+
+
 def prepare_gm_description(guests: List[dict]) -> str:
     description = '<br>'.join([
         f"<b>{guest['name']}</b><br>{guest['title']}<br>"
@@ -137,19 +330,92 @@ def prepare_gm_description(guests: List[dict]) -> str:
     return description
 
 
+RU_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('января', 'январь', 'янв'),
+        ('февраля', 'февраль', 'фев'),
+        ('марта', 'март', 'мар'),
+        ('апреля', 'апрель', 'апр'),
+        ('мая', 'май'),
+        ('июня', 'июнь', 'июн'),
+        ('июля', 'июль', 'июл'),
+        ('августа', 'август', 'авг'),
+        ('сентября', 'сентябрь', 'сен', 'сент'),
+        ('октября', 'октябрь', 'окт'),
+        ('ноября', 'ноябрь', 'ноя'),
+        ('декабря', 'декабрь', 'дек'),
+    ], start=1)
+    for name in names
+}
+
+RU_DATETIME_RE = re.compile(
+    r'^(?P<day>\d{1,2})\s+(?P<month>[а-яё]+)\.?'
+    r'(?:\s+(?P<year>\d{4}))?'
+    r'(?:,?\s+(?P<hour>\d{1,2}):(?P<minute>\d{2}))?$'
+)
+
+
+@lru_cache(maxsize=4096)
+def parse_ru_date_fast(raw_dt: str, default_year: int) -> Optional[datetime]:
+    match = RU_DATETIME_RE.match(raw_dt.strip().lower())
+    month = match and RU_MONTHS.get(match['month'])
+
+    if not month:
+        return None
+
+    try:
+        return datetime(
+            int(match['year'] or default_year),
+            month,
+            int(match['day']),
+            int(match['hour'] or 0),
+            int(match['minute'] or 0),
+        )
+    except ValueError:
+        # "29 февраля" of a non-leap year, left to dateparser
+        return None
+
+
+def parse_ru_datetime(raw_dt: str, default_year: int) -> Optional[datetime]:
+    parsed = parse_ru_date_fast(raw_dt, default_year)
+
+    # Relative dates like "вчера" must not be cached, so they skip the LRU
+    if parsed is None:
+        import dateparser
+
+        parsed = dateparser.parse(raw_dt, ['ru'])
+
+    return parsed
+
+
+def shift_month(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def gm_download_link(raw_episode) -> Optional[Tag]:
+    return raw_episode.find('a', {'class': 'download'})
+
+
 def parse_gm_episode(
         program: Program,
-        raw_episode) -> Optional[Episode]:
+        month: date,
+        raw_episode,
+        records: Dict[str, tuple] = None) -> Optional[Episode]:
 
+    # Listings only show the day and month, the year is the one of the
+    # listed month, except for December episodes on a January page
     raw_dt = raw_episode.find('div', {'class': 'time'}).span.text.strip()
-    episode_date = dateparser.parse(raw_dt, ['ru'])
+    episode_date = parse_ru_datetime(raw_dt, month.year)
 
-    if (date.today() - episode_date.date()).days < 0:
-        episode_date = datetime(
-            episode_date.year - 1,
-            episode_date.month,
-            episode_date.day
-        )
+    if episode_date is None:
+        logger.warning('Skipping episode with date %r of %s', raw_dt, program)
+        return None
+
+    if episode_date.year == month.year and episode_date.month > month.month:
+        episode_date = episode_date.replace(year=month.year - 1)
 
     raw_guests = raw_episode.find_all('a', {'class': 'person'})
     parsed_guests = [parse_gm_guest(x) for x in raw_guests]
@@ -164,8 +430,8 @@ def parse_gm_episode(
             raw_title = program.title_ru
 
     try:
-        file_name = raw_episode.find('a', {'class': 'download'})['download']
-        file_url = raw_episode.find('a', {'class': 'download'})['href']
+        file_name = gm_download_link(raw_episode)['download']
+        file_url = gm_download_link(raw_episode)['href']
     except TypeError:
         return None
 
@@ -173,11 +439,14 @@ def parse_gm_episode(
     #     return None
 
     try:
-        duration, file_size = file_info(file_url, file_name)
-    except InvalidURL:
+        duration, file_size = file_info(file_url, file_name, records)
+    except RequestException as e:
+        logger.warning('Skipping episode %s: %s', file_url, e)
         return None
 
     episode = Episode(
+        program=program,
+        guid=string_hash(file_url),
         date=episode_date,
         title=f'{raw_title} ({episode_date.date()})',
         description=prepare_gm_description(parsed_guests),
@@ -191,27 +460,14 @@ def parse_gm_episode(
     return episode
 
 
-def collect_gm_raw_episodes(
+def collect_gm_month_episodes(
         program: Program,
-        date_string: str = 'this month',
-        raw_episodes: List[ResultSet] = None,
-        desired_episodes_num: int = 10,
-        last_try: bool = False) -> List[ResultSet]:
-
-    if not raw_episodes:
-        raw_episodes = list()
+        month: date) -> List[Tuple[date, Tag]]:
 
-    curr_date = dateparser.parse(date_string)
-    url_suffix = f'?month={curr_date.month}&year={curr_date.year}'
+    url_suffix = f'?month={month.month}&year={month.year}'
     full_program_url = program.url + url_suffix
 
-    time.sleep(2)
-    response = requests.get(full_program_url)
-
-    if response.status_code != 200:
-        raise InvalidURL(program.url)
-
-    soup = BeautifulSoup(response.content, 'html.parser')
+    soup = get_page_soup(full_program_url, GM_PROGRAM_PAGE)
     episodes_wrapper = soup.find('div', {'class': 'oneProgramPage'})
     episodes = episodes_wrapper.ul.findChildren('li', recursive=False)
 
@@ -219,31 +475,122 @@ def collect_gm_raw_episodes(
         'Выпусков в этом месяце не было'
         not in episodes[0].text
     )
-    if were_episodes_this_month:
-        raw_episodes.extend(episodes)
+    if not were_episodes_this_month:
+        return []
 
-    if not last_try and len(raw_episodes) < desired_episodes_num:
-        raw_episodes = collect_gm_raw_episodes(
-            program=program,
-            date_string='last month',
-            raw_episodes=raw_episodes,
-            last_try=True,
-        )
+    return [(month, episode) for episode in episodes]
+
+
+def months_to_scan(program: Program, desired_episodes_num: int) -> int:
+    max_months = settings.GM_BACKFILL_MONTHS
+
+    # A program without history gets a deep backfill on its first build
+    if not program.episodes.exists():
+        return max_months
+
+    window_days = 90
+    recent_episodes = program.episodes.filter(
+        date__gte=timezone.now() - timedelta(days=window_days),
+    ).count()
+
+    if not recent_episodes:
+        return min(2, max_months)
+
+    needed_days = desired_episodes_num * window_days / recent_episodes
+    days_this_month = date.today().day
+
+    if needed_days <= days_this_month:
+        return 1
+
+    months = 1 + math.ceil((needed_days - days_this_month) / 30)
+
+    return min(months, max_months)
+
+
+def collect_gm_raw_episodes(
+        program: Program,
+        desired_episodes_num: Optional[int] = 10,
+        months: int = None) -> List[Tuple[date, Tag]]:
+
+    if months is None:
+        months = months_to_scan(program, desired_episodes_num or 0)
+
+    this_month = date.today()
+    months_to_fetch = [shift_month(this_month, -i) for i in range(months)]
+
+    raw_episodes = []
+    batch_size = max(settings.MONTH_WORKERS, 1)
+
+    # Months are fetched in batches, newest first, so a program that has
+    # enough episodes in recent months does not pay for the older ones
+    with ThreadPoolExecutor(max_workers=batch_size) as executor:
+        for start in range(0, len(months_to_fetch), batch_size):
+            batch = months_to_fetch[start:start + batch_size]
+            pages = executor.map(
+                partial(collect_gm_month_episodes, program),
+                batch,
+            )
+
+            for episodes in pages:
+                raw_episodes.extend(episodes)
+
+            enough_episodes = (
+                desired_episodes_num is not None
+                and len(raw_episodes) >= desired_episodes_num
+            )
+            if enough_episodes:
+                break
 
     return raw_episodes
 
 
-def parse_gm_episodes(program: Program) -> List[Episode]:
-    raw_episodes = collect_gm_raw_episodes(program)
+def prefetch_gm_episode_records(raw_episodes) -> Dict[str, tuple]:
+    links = [gm_download_link(raw_episode) for _, raw_episode in raw_episodes]
+
+    return episode_records(link['href'] for link in links if link)
 
-    parsed_episodes = []
-    for raw_episode in raw_episodes:
-        parsed_episode = parse_gm_episode(program, raw_episode)
 
-        if parsed_episode:
-            parsed_episodes.append(parsed_episode)
+def run_in_threads(func, items: list, workers: int) -> list:
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
 
-    return parsed_episodes
+    def run_and_close(item):
+        try:
+            return func(item)
+        finally:
+            # Every worker thread opens its own DB connection
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_and_close, items))
+
+
+def parse_gm_episodes(
+        program: Program,
+        workers: int = None,
+        backfill_months: int = None) -> List[Episode]:
+
+    if backfill_months:
+        raw_episodes = collect_gm_raw_episodes(
+            program,
+            desired_episodes_num=None,
+            months=backfill_months,
+        )
+    else:
+        raw_episodes = collect_gm_raw_episodes(program)
+    records = prefetch_gm_episode_records(raw_episodes)
+
+    if workers is None:
+        workers = settings.EPISODE_WORKERS
+
+    def parse(listed_episode: Tuple[date, Tag]) -> Optional[Episode]:
+        month, raw_episode = listed_episode
+        return parse_gm_episode(program, month, raw_episode, records)
+
+    # Results come back in input order, as collect_feed expects
+    parsed_episodes = run_in_threads(parse, raw_episodes, workers)
+
+    return [episode for episode in parsed_episodes if episode]
 
 
 def prepare_gm_title(
@@ -259,7 +606,7 @@ def prepare_gm_title(
 
 
 def collect_gm_raw_programs(root_url: str):
-    soup = get_page_soup(root_url)
+    soup = get_page_soup(root_url, GM_PROGRAMS_INDEX)
     programs_root = soup.find('div', {'id': 'programs'})
     programs_wrapper = programs_root.findAll('ul', {'class': 'programsList'})
 
@@ -272,6 +619,8 @@ def collect_gm_raw_programs(root_url: str):
 
 
 def ru_title_to_en(name):
+    from transliterate import translit
+
     translited = translit(name, 'ru', reversed=True)
     cleaned = ''
 
@@ -288,7 +637,7 @@ def parse_gm_program(station: Station, raw_program: Tag) -> Program:
     # TODO replace 'replace'
     program_url = raw_program.find('a')['href'].replace('/broadcasts/', '')
     full_url = station.programs_root + program_url
-    program_page_soup = get_page_soup(full_url)
+    program_page_soup = get_page_soup(full_url, GM_PROGRAM_PAGE)
 
     name = clean_gm_title(
         program_page_soup.find('div', {'class', 'pageHeader'}).h1.text
@@ -379,30 +728,71 @@ def notify_programs_status_change(station: Station) -> bool:
     return bool(message_sent)
 
 
-def update_gm_programs() -> None:
-    station = Station.objects.filter(name='Говорит Москва').first()
-
-    for program in station.programs.all():
-        program.status = 'archive'
-        program.save()
+def reconcile_programs(station: Station, programs: List[Program]) -> bool:
+    existing_programs = {
+        program.title_ru: program
+        for program
+        in station.programs.all()
+    }
 
-    programs = parse_gm_programs(station)
+    scraped_titles = set()
+    new_programs = []
 
     for program in programs:
         if 'повтор' in program.title_ru:
             continue
+        if program.title_ru in scraped_titles:
+            continue
 
-        existing_program = Program.objects.filter(
-            title_ru=program.title_ru
-        ).first()
+        scraped_titles.add(program.title_ru)
 
-        if existing_program:
-            existing_program.status = 'current'
-            # existing_program.hosts = program.hosts
-            existing_program.save()
-        else:
+        if program.title_ru not in existing_programs:
             program.status = 'new'
-            program.save()
+            new_programs.append(program)
+
+    changed_programs = []
+
+    for title, program in existing_programs.items():
+        status = 'current' if title in scraped_titles else 'archive'
+
+        if program.status != status:
+            program.status = status
+            changed_programs.append(program)
+
+    with transaction.atomic():
+        Program.objects.bulk_create(new_programs)
+        Program.objects.bulk_update(changed_programs, ['status'])
+
+    changed = bool(new_programs or changed_programs)
+
+    if changed:
+        invalidate_index_page()
+
+    return changed
+
+
+def prepare_missing_gm_images(station: Station) -> None:
+    programs = list(
+        station.programs
+        .exclude(status='archive')
+        .filter(image_path='')
+    )
+
+    image_paths = prepare_gm_images(
+        [(program.title_ru, program.title_en) for program in programs],
+        workers=settings.IMAGE_WORKERS,
+    )
+
+    for program, image_path in zip(programs, image_paths):
+        program.image_path = image_path
+
+    Program.objects.bulk_update(programs, ['image_path'])
+
+
+def update_gm_programs(station: Station) -> None:
+    programs = parse_gm_programs(station)
+    reconcile_programs(station, programs)
+    prepare_missing_gm_images(station)
 
     mail_sent = notify_programs_status_change(station)
 
@@ -412,13 +802,27 @@ def update_gm_programs() -> None:
     return None
 
 
+def as_utc(dt: datetime) -> datetime:
+    # Scraped dates are naive and have always been published as UTC
+    if dt.tzinfo is None:
+        return pytz.utc.localize(dt)
+
+    return dt
+
+
+def station_time(dt: datetime) -> datetime:
+    # The "UTC" of stored episode dates is the station's wall-clock time,
+    # it has to be placed in its zone before being compared with now
+    naive = dt.replace(tzinfo=None)
+
+    return pytz.timezone(settings.TIME_ZONE).localize(naive)
+
+
 def collect_feed_entry(
         program: Program,
-        episode: Episode) -> FeedEntry:
+        episode: Episode) -> 'FeedEntry':
 
-    minutes, seconds = divmod(episode.duration, 60)
-    hours, minutes = divmod(minutes, 60)
-    duration = '%02d:%02d:%02d' % (hours, minutes, seconds)
+    from feedgen.entry import FeedEntry
 
     entry = FeedEntry()
     entry.load_extension('podcast')
@@ -426,17 +830,19 @@ def collect_feed_entry(
     entry.title(episode.title)
     entry.link(href=program.url)
     entry.description(episode.description)
-    entry.published(pytz.utc.localize(episode.date))
+    entry.published(as_utc(episode.date))
     entry.guid(string_hash(episode.file_url))
     entry.enclosure(episode.file_url, str(episode.file_size), 'audio/mpeg')
-    entry.podcast.itunes_duration(duration)
+    entry.podcast.itunes_duration(itunes_duration(episode.duration))
 
     return entry
 
 
 def collect_feed(
         program: Program,
-        episodes: List[Episode]) -> FeedGenerator:
+        episodes: List[Episode]) -> 'FeedGenerator':
+
+    from feedgen.feed import FeedGenerator
 
     feed = FeedGenerator()
     feed.load_extension('podcast')
@@ -455,48 +861,448 @@ def collect_feed(
     return feed
 
 
-def parse_gm(station: Station) -> None:
-    for program in station.programs.all():
-        if not program.image_path:
-            image_path = prepare_gm_image(program.title_ru, program.title_en)
-            program.image_path = image_path
-            program.save()
+EPISODE_FIELDS = [
+    'date',
+    'title',
+    'description',
+    'duration',
+    'guests',
+    'file_name',
+    'file_url',
+    'file_size',
+]
+
+
+def store_episodes(program: Program, episodes: List[Episode]) -> int:
+    scraped_episodes = {}
+
+    for episode in episodes:
+        episode.program = program
+        episode.guid = episode.guid or string_hash(episode.file_url)
+        episode.date = as_utc(episode.date)
+        scraped_episodes[episode.guid] = episode
+
+    existing_episodes = {
+        episode.guid: episode
+        for episode
+        in program.episodes.filter(guid__in=list(scraped_episodes))
+    }
+
+    new_episodes = []
+    changed_episodes = []
+
+    for guid, episode in scraped_episodes.items():
+        stored = existing_episodes.get(guid)
+
+        if stored is None:
+            new_episodes.append(episode)
+            continue
+
+        changed = [
+            field
+            for field in EPISODE_FIELDS
+            if getattr(stored, field) != getattr(episode, field)
+        ]
+
+        if changed:
+            for field in changed:
+                setattr(stored, field, getattr(episode, field))
+            changed_episodes.append(stored)
+
+    with transaction.atomic():
+        Episode.objects.bulk_create(new_episodes)
+        Episode.objects.bulk_update(changed_episodes, EPISODE_FIELDS)
+
+    return len(new_episodes) + len(changed_episodes)
 
-        episodes = parse_gm_episodes(program)
+
+def stored_episodes(program: Program) -> List[Episode]:
+    return list(program.episodes.all()[:settings.FEED_EPISODES_LIMIT])
+
+
+def feed_fingerprint(
+        program: Program,
+        episodes: List[Episode]) -> str:
+
+    parts = [
+        str(FEED_FORMAT_VERSION),
+        settings.FEED_WRITER,
+        str(settings.FEED_PRETTY),
+        program.title_ru,
+        program.station.name,
+        program.url,
+        program.image_path,
+        program.description,
+    ]
+
+    for episode in episodes:
+        parts.extend([
+            string_hash(episode.file_url),
+            str(episode.file_size),
+            str(episode.duration),
+            str(episode.date),
+            episode.title,
+            episode.description,
+        ])
+
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def render_feed(
+        program: Program,
+        episodes: List[Episode]) -> bytes:
+
+    if settings.FEED_WRITER == 'feedgen':
         feed = collect_feed(program, episodes)
+        return feed.rss_str(pretty=settings.FEED_PRETTY)
+
+    return rss_bytes(program, episodes, pretty=settings.FEED_PRETTY)
+
+
+def feed_file_path(program: Program) -> str:
+    return feed_path(program.station.short_latin_name, program.title_en)
+
+
+def write_feed(
+        program: Program,
+        episodes: List[Episode],
+        force: bool = False) -> bool:
+
+    fingerprint = feed_fingerprint(program, episodes)
+    file_name = feed_file_path(program)
+
+    feed_unchanged = (
+        not force
+        and program.feed_fingerprint == fingerprint
+        and os.path.exists(file_name)
+    )
+    if feed_unchanged:
+        return False
+
+    with metrics.FEED_WRITE_SECONDS.time():
+        content = render_feed(program, episodes)
+        encoded = write_feed_files(file_name, content)
 
-        file_name = os.path.join(
-            settings.BASE_DIR,
-            'rsser',
-            'feeds',
-            'gm',
-            f'{program.title_en}.xml',
+    last_episode_date = None
+    if episodes:
+        last_episode_date = max(
+            as_utc(episode.date)
+            for episode
+            in episodes
         )
 
-        feed.rss_file(file_name, pretty=True)
+    program.feed_fingerprint = fingerprint
+    program.last_episode_date = last_episode_date
+    # Last-Modified of the feed. Episodes only carry a date, so another
+    # episode of the same day or an edited one would not move their date
+    program.feed_updated = timezone.now()
+    program.save(update_fields=[
+        'feed_fingerprint',
+        'last_episode_date',
+        'feed_updated',
+    ])
 
-    return None
+    store_feed(
+        program.station.short_latin_name,
+        program.title_en,
+        content,
+        program.feed_updated,
+        encoded,
+    )
 
+    return True
 
-def update_programs():
-    stations = Station.objects.all()
-    updaters = {
-        'Говорит Москва': update_gm_programs,
-    }
 
-    for station in stations:
-        updaters[station.name]()
+def build_gm_feed(program: Program, backfill_months: int = None) -> bool:
+    episodes = parse_gm_episodes(program, backfill_months=backfill_months)
+    store_episodes(program, episodes)
 
-    return None
+    return write_feed(program, stored_episodes(program))
 
 
-def build_rss_files():
-    stations = Station.objects.all()
-    parsers = {
-        'Говорит Москва': parse_gm,
-    }
+def build_program_feed(program: Program, **options) -> BuildResult:
+    adapter = stations.get_adapter(program.station)
+    started = time.perf_counter()
+
+    try:
+        if not program.image_path:
+            program.image_path = adapter.prepare_image(program)
+            program.save(update_fields=['image_path'])
+
+        changed = adapter.build_feed(program, **options)
+    except Exception as e:
+        logger.exception('Failed to build feed for %s', program)
+        result = BuildResult(
+            program.title_ru, False, f'{type(e).__name__}: {e}',
+        )
+    else:
+        result = BuildResult(program.title_ru, changed, None)
+
+    elapsed = time.perf_counter() - started
+    outcome = 'failed' if result.error else (
+        'changed' if result.changed else 'unchanged'
+    )
+    metrics.PROGRAM_BUILDS.inc(result=outcome)
+    metrics.PROGRAM_BUILD_SECONDS.observe(elapsed)
+    metrics.PROGRAM_SECONDS.inc(elapsed, program=program.title_en)
+
+    return result
+
+
+def stations_with_adapters() -> List[tuple]:
+    known_stations = []
 
-    for station in stations:
-        parsers[station.name](station)
+    for station in Station.objects.all():
+        adapter = stations.get_adapter(station)
+        if adapter is not None:
+            known_stations.append((station, adapter))
+
+    return known_stations
+
+
+def update_station_programs(item: tuple) -> None:
+    station, adapter = item
+    adapter.update_programs(station)
+
+
+def update_programs() -> None:
+    known_stations = stations_with_adapters()
+
+    # Every station only talks to its own hosts, so they run side by side
+    run_in_threads(
+        update_station_programs,
+        known_stations,
+        len(known_stations),
+    )
 
     return None
+
+
+def render_program_feed(program: Program, force: bool = False) -> BuildResult:
+    try:
+        episodes = stored_episodes(program)
+        changed = bool(episodes) and write_feed(program, episodes, force)
+    except Exception as e:
+        logger.exception('Failed to render feed for %s', program)
+        return BuildResult(program.title_ru, False, f'{type(e).__name__}: {e}')
+
+    return BuildResult(program.title_ru, changed, None)
+
+
+def render_feeds(force: bool = False) -> List[BuildResult]:
+    return [
+        render_program_feed(program, force)
+        for program
+        in Program.objects.select_related('station')
+    ]
+
+
+def init_build_worker(workers: int) -> None:
+    # Ctrl-C and systemctl stop signal the whole process group; the parent
+    # decides when to stop, workers finish the program they are building
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    django.setup()
+    reset_session()
+    # The host budgets are shared by all workers of the pool
+    scale_rate_limits(1 / workers)
+
+    stations.declare_rate_limits(workers)
+
+
+def build_program_feed_in_worker(
+        program_id: int,
+        **options) -> Tuple[BuildResult, dict]:
+
+    # Metrics of the worker are shipped back with every result, so the
+    # parent ends up with the totals of the whole pool
+    metrics.reset()
+    program = Program.objects.select_related('station').get(pk=program_id)
+    result = build_program_feed(program, **options)
+
+    return result, metrics.snapshot()
+
+
+def build_program_feed_in_pool(
+        executor: ProcessPoolExecutor,
+        program: Program,
+        **options) -> BuildResult:
+
+    try:
+        future = executor.submit(
+            partial(build_program_feed_in_worker, **options),
+            program.id,
+        )
+    except BrokenProcessPool:
+        # A worker died earlier in this run, the programs left are built
+        # here rather than all failing with it
+        return build_program_feed(program, **options)
+
+    try:
+        result, worker_metrics = future.result()
+    except BrokenProcessPool as e:
+        # The worker was killed (OOM, segfault) while building this or
+        # another program, which breaks every future still running
+        logger.error('Worker building %s died', program)
+        metrics.PROGRAM_BUILDS.inc(result='failed')
+        return BuildResult(program.title_ru, False, f'{type(e).__name__}: {e}')
+
+    metrics.merge(worker_metrics)
+
+    return result
+
+
+def build_station_feeds(build_program, item: tuple) -> List[BuildResult]:
+    adapter, programs = item
+
+    # No more than max_concurrency programs of a station are built at
+    # once, whether in threads of this process or in the pool
+    return run_in_threads(build_program, programs, adapter.max_concurrency)
+
+
+def build_stations(
+        stations_programs: list,
+        build_program) -> List[BuildResult]:
+
+    station_results = run_in_threads(
+        partial(build_station_feeds, build_program),
+        stations_programs,
+        len(stations_programs),
+    )
+
+    return [result for results in station_results for result in results]
+
+
+def build_pool_size(workers: int) -> int:
+    # Stations never have more than max_concurrency programs in flight,
+    # workers beyond their sum would sit idle
+    busy_workers = sum(
+        adapter.max_concurrency
+        for adapter
+        in stations.adapters().values()
+    )
+
+    if workers > busy_workers:
+        logger.warning(
+            'At most %d programs are built at once, '
+            'starting %d workers instead of %d',
+            busy_workers,
+            max(busy_workers, 1),
+            workers,
+        )
+        return max(busy_workers, 1)
+
+    return workers
+
+
+def start_build_pool(workers: int) -> ProcessPoolExecutor:
+    workers = build_pool_size(workers)
+
+    # Forked workers must not inherit open database connections
+    connections.close_all()
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_build_worker,
+        initargs=(workers,),
+    )
+    # Workers are otherwise forked by the first build, from whichever
+    # station thread submits it
+    ping_build_pool(executor)
+
+    return executor
+
+
+def ping_build_pool(executor: ProcessPoolExecutor) -> bool:
+    # A no-op round trip through the pool, False once a worker has died
+    try:
+        executor.submit(int).result()
+    except BrokenProcessPool:
+        return False
+
+    return True
+
+
+def due_programs(station: Station, force: bool = False):
+    programs = station.programs.select_related('station')
+
+    if force:
+        return programs
+
+    return programs.exclude(status='archive').filter(
+        Q(next_refresh__isnull=True) | Q(next_refresh__lte=timezone.now()),
+    )
+
+
+def plan_next_refresh(program: Program, now: datetime) -> datetime:
+    dates = program.episodes.values_list('date', flat=True)
+
+    return cadence.next_refresh(
+        [station_time(day) for day in dates[:settings.REFRESH_HISTORY]],
+        now,
+        timedelta(seconds=settings.REFRESH_MIN_INTERVAL),
+        timedelta(seconds=settings.REFRESH_MAX_INTERVAL),
+    )
+
+
+def schedule_refreshes(
+        programs: List[Program],
+        results: List[BuildResult],
+        started: datetime) -> None:
+
+    retry_interval = timedelta(seconds=settings.REFRESH_MIN_INTERVAL)
+
+    for program, result in zip(programs, results):
+        program.last_scraped = started
+
+        if result.error:
+            program.next_refresh = started + retry_interval
+        else:
+            program.next_refresh = plan_next_refresh(program, started)
+
+    Program.objects.bulk_update(programs, ['last_scraped', 'next_refresh'])
+
+
+def build_rss_files(
+        workers: int = 1,
+        executor: ProcessPoolExecutor = None,
+        force: bool = False,
+        **options) -> List[BuildResult]:
+
+    started = timezone.now()
+    stations_programs = [
+        (adapter, list(due_programs(station, force)))
+        for station, adapter
+        in stations_with_adapters()
+    ]
+
+    if executor is not None:
+        results = build_stations(
+            stations_programs,
+            partial(build_program_feed_in_pool, executor, **options),
+        )
+    elif workers <= 1:
+        results = build_stations(
+            stations_programs,
+            partial(build_program_feed, **options),
+        )
+    else:
+        with start_build_pool(workers) as executor:
+            results = build_stations(
+                stations_programs,
+                partial(build_program_feed_in_pool, executor, **options),
+            )
+
+    # Results come back in the order of the programs
+    programs = [
+        program
+        for _, station_programs in stations_programs
+        for program in station_programs
+    ]
+    schedule_refreshes(programs, results, started)
+
+    if any(result.changed for result in results):
+        invalidate_index_page()
+
+    return results
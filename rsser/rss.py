@@ -0,0 +1,139 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import BinaryIO, Iterable, Iterator
+
+from rsser.models import Episode, Program
+
+ITUNES_NS = 'http://www.itunes.com/dtds/podcast-1.0.dtd'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+CONTENT_NS = 'http://purl.org/rss/1.0/modules/content/'
+
+# Characters that are not allowed anywhere in an XML 1.0 document
+INVALID_XML_CHARS = re.compile(
+    '[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]'
+)
+
+
+# Chained str.replace is several times faster than str.translate here
+def escape_text(value) -> str:
+    return (
+        INVALID_XML_CHARS.sub('', str(value))
+        .replace('&', '&amp;')
+        .replace('<', '&lt;')
+        .replace('>', '&gt;')
+    )
+
+
+def escape_attr(value) -> str:
+    return (
+        escape_text(value)
+        .replace('"', '&quot;')
+        .replace('\n', '&#10;')
+        .replace('\r', '&#13;')
+        .replace('\t', '&#9;')
+    )
+
+
+def rfc822(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+
+    return format_datetime(dt)
+
+
+def itunes_duration(seconds: int) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return '%02d:%02d:%02d' % (hours, minutes, seconds)
+
+
+def episode_guid(episode: Episode) -> str:
+    if episode.guid:
+        return episode.guid
+
+    return hashlib.md5(episode.file_url.encode('utf-8')).hexdigest()
+
+
+def iter_rss(
+        program: Program,
+        episodes: Iterable[Episode],
+        pretty: bool = True,
+        last_build_date: datetime = None) -> Iterator[str]:
+
+    if last_build_date is None:
+        last_build_date = datetime.now(timezone.utc)
+
+    newline = '\n' if pretty else ''
+
+    def line(level: int, markup: str) -> str:
+        indent = '  ' * level if pretty else ''
+        return f'{indent}{markup}{newline}'
+
+    def element(level: int, tag: str, text) -> str:
+        return line(level, f'<{tag}>{escape_text(text)}</{tag}>')
+
+    feed_title = f'{program.title_ru} :: {program.station.name}'
+    # Shared by every item, so escaped once
+    item_link = element(3, 'link', program.url)
+
+    yield "<?xml version='1.0' encoding='UTF-8'?>\n"
+    yield line(0, (
+        f'<rss xmlns:itunes="{ITUNES_NS}" xmlns:atom="{ATOM_NS}" '
+        f'xmlns:content="{CONTENT_NS}" version="2.0">'
+    ))
+    yield line(1, '<channel>')
+    yield element(2, 'title', feed_title)
+    yield element(2, 'link', program.url)
+    yield element(2, 'description', program.description)
+    yield element(2, 'docs', 'http://www.rssboard.org/rss-specification')
+    yield element(2, 'generator', 'rsser')
+    yield line(2, '<image>')
+    yield element(3, 'url', program.image_path)
+    yield element(3, 'title', feed_title)
+    yield element(3, 'link', program.url)
+    yield line(2, '</image>')
+    yield element(2, 'language', 'ru')
+    yield element(2, 'lastBuildDate', rfc822(last_build_date))
+
+    for episode in episodes:
+        enclosure = (
+            f'<enclosure url="{escape_attr(episode.file_url)}" '
+            f'length="{escape_attr(episode.file_size)}" type="audio/mpeg"/>'
+        )
+        guid = escape_text(episode_guid(episode))
+
+        yield ''.join([
+            line(2, '<item>'),
+            element(3, 'title', episode.title),
+            item_link,
+            element(3, 'description', episode.description),
+            line(3, f'<guid isPermaLink="false">{guid}</guid>'),
+            line(3, enclosure),
+            element(3, 'pubDate', rfc822(episode.date)),
+            element(3, 'itunes:duration', itunes_duration(episode.duration)),
+            line(2, '</item>'),
+        ])
+
+    yield line(1, '</channel>')
+    yield line(0, '</rss>')
+
+
+def write_rss(
+        out: BinaryIO,
+        program: Program,
+        episodes: Iterable[Episode],
+        pretty: bool = True) -> None:
+
+    for chunk in iter_rss(program, episodes, pretty):
+        out.write(chunk.encode('utf-8'))
+
+
+def rss_bytes(
+        program: Program,
+        episodes: Iterable[Episode],
+        pretty: bool = True) -> bytes:
+
+    return ''.join(iter_rss(program, episodes, pretty)).encode('utf-8')
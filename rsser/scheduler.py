@@ -0,0 +1,102 @@
+import fcntl
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from rsser import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def job_lock(name: str) -> Iterator[bool]:
+    # flock() is released by the kernel when the process dies, so a
+    # crashed run never leaves a stale lock behind
+    os.makedirs(settings.LOCKS_DIR, exist_ok=True)
+    path = os.path.join(settings.LOCKS_DIR, f'{name}.lock')
+
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class Job:
+    def __init__(self, name: str, interval: float, func: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic()
+
+    def __str__(self):
+        return self.name
+
+
+class Scheduler:
+    def __init__(self, jobs: List[Job]):
+        self.jobs = jobs
+        self.stopping = threading.Event()
+
+    def run_job(self, job: Job) -> str:
+        with job_lock(job.name) as locked:
+            if not locked:
+                logger.warning('%s is already running, skipping', job)
+                return 'skipped'
+
+            # The database may have dropped connections idle since last run
+            close_old_connections()
+
+            try:
+                job.func()
+            except Exception:
+                logger.exception('%s failed', job)
+                return 'failed'
+            finally:
+                close_old_connections()
+
+        return 'ok'
+
+    def run_pending(self) -> None:
+        job = min(self.jobs, key=lambda job: job.next_run)
+        delay = job.next_run - time.monotonic()
+
+        if delay > 0 and self.stopping.wait(delay):
+            return
+
+        started = time.monotonic()
+        logger.info('Running %s', job)
+        result = self.run_job(job)
+        logger.info('%s: %s in %.1f s', job, result, time.monotonic() - started)
+
+        metrics.SCHEDULER_RUNS.inc(job=job.name, result=result)
+        metrics.dump('run_scheduler')
+
+        job.next_run = started + job.interval
+
+    def stop(self, *args) -> None:
+        if not self.stopping.is_set():
+            logger.info('Stopping after the running job finishes')
+        self.stopping.set()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Jobs run one at a time, so a catalog refresh and a feed build
+        # never add up against the same station
+        while not self.stopping.is_set():
+            self.run_pending()
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rsser.caching import invalidate_index_page
+from rsser.models import Program, Station
+
+
+# Catalog reconciliation and feed builds use bulk queries, which send no
+# signals, so they invalidate the index page themselves
+@receiver([post_save, post_delete], sender=Program)
+@receiver([post_save, post_delete], sender=Station)
+def invalidate_index_on_change(sender, **kwargs) -> None:
+    invalidate_index_page()
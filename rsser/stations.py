@@ -0,0 +1,88 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple, Type
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from rsser.models import Program, Station
+
+logger = logging.getLogger(__name__)
+
+
+class StationAdapter(ABC):
+    short_latin_name = ''
+    # Hosts the adapter requests pages and audio files from
+    hosts: Tuple[str, ...] = ()
+    # Request budget of every host: requests per second and burst size
+    rate_limit = 0.5
+    rate_burst = 1
+    # Number of programs of the station built at the same time
+    max_concurrency = 1
+
+    @abstractmethod
+    def update_programs(self, station: Station) -> None:
+        ...
+
+    @abstractmethod
+    def build_feed(self, program: Program, **options) -> bool:
+        ...
+
+    @abstractmethod
+    def prepare_image(self, program: Program) -> str:
+        ...
+
+    def declare_rate_limits(self, workers: int = 1) -> None:
+        # rsser.network brings in requests, which web workers never need
+        from rsser.network import declare_host_rate_limit
+
+        # Every process building programs of the station gets an equal
+        # part of the budget, so together they stay within it
+        share = max(min(self.max_concurrency, workers), 1)
+
+        for host in self.hosts:
+            declare_host_rate_limit(
+                host,
+                self.rate_limit,
+                self.rate_burst,
+                scale=1 / share,
+            )
+
+
+_adapters: Dict[str, StationAdapter] = {}
+
+
+def register(adapter_class: Type[StationAdapter]) -> Type[StationAdapter]:
+    # An adapter missing any of the abstract methods fails here, when the
+    # app loads, instead of in the middle of a build
+    adapter = adapter_class()
+    _adapters[adapter.short_latin_name] = adapter
+
+    return adapter_class
+
+
+def load_adapters() -> None:
+    for path in settings.STATION_ADAPTERS:
+        register(import_string(path))
+
+
+def declare_rate_limits(workers: int = 1) -> None:
+    for adapter in _adapters.values():
+        adapter.declare_rate_limits(workers)
+
+
+def adapters() -> Dict[str, StationAdapter]:
+    return dict(_adapters)
+
+
+def get_adapter(station: Station) -> Optional[StationAdapter]:
+    adapter = _adapters.get(station.short_latin_name)
+
+    if adapter is None:
+        logger.warning(
+            'No adapter for station %s (%s), skipping it',
+            station,
+            station.short_latin_name,
+        )
+
+    return adapter
@@ -1,7 +1,83 @@
+import base64
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+from unittest import mock, skipUnless
+
+import dateparser
 from bs4 import BeautifulSoup
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import (
+    CommandError,
+    call_command,
+    get_commands,
+    load_command_class,
+)
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from tinytag import TinyTag
+
+from rsser import (
+    audio,
+    cadence,
+    caching,
+    gm,
+    metrics,
+    network,
+    parsers,
+    rss,
+    scheduler,
+    stations,
+    utils,
+)
+from rsser.models import Episode, EpisodeRecord, Program, Station
+
+
+# The tests clear the cache, keep them away from the project's one
+cache_dir = tempfile.TemporaryDirectory()
+cache_override = override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': cache_dir.name,
+    },
+})
+
+
+def setUpModule():
+    cache_override.enable()
+
+
+def tearDownModule():
+    cache_override.disable()
+    cache_dir.cleanup()
 
-from rsser import parsers
+
+def mp3_frame(header: bytes = b'\xff\xfb\x90\x00') -> bytes:
+    # MPEG-1 Layer III, 128 kbit/s, 44100 Hz, stereo: 417 bytes per frame
+    return header + bytes(413)
+
+
+def xing_frame(frames_count: int) -> bytes:
+    frame = bytearray(mp3_frame())
+    frame[36:40] = b'Xing'
+    frame[40:44] = (1).to_bytes(4, 'big')
+    frame[44:48] = frames_count.to_bytes(4, 'big')
+    return bytes(frame)
 
 
 class GmParserTests(TestCase):
@@ -75,3 +151,1635 @@ class GmParserTests(TestCase):
                 '<b>Дарья Шишканова</b><br>Спортивный агент<br>'
             )
         )
+
+
+class AudioTests(TestCase):
+
+    def test_id3v2_size(self):
+        f = audio.id3v2_size
+        self.assertEqual(f(b''), 0)
+        self.assertEqual(f(mp3_frame()), 0)
+        self.assertEqual(f(b'ID3\x04\x00\x00\x00\x00\x02\x01'), 10 + 257)
+        self.assertEqual(f(b'ID3\x04\x00\x10\x00\x00\x00\x05'), 25)
+
+    def test_mp3_duration_cbr(self):
+        f = audio.mp3_duration
+        data = mp3_frame() * 10
+        self.assertAlmostEqual(f(data, 16000000), 1000.0)
+        self.assertAlmostEqual(f(data, 16000000 + 1000, offset=1000), 1000.0)
+        self.assertIsNone(f(bytes(4096), 16000000))
+
+    def test_mp3_duration_skips_false_sync(self):
+        f = audio.mp3_duration
+        data = b'\xff\xfb\x90\x00junk' + mp3_frame() * 3
+        self.assertAlmostEqual(f(data, 16000000 + 8), 1000.0)
+
+    def test_mp3_duration_vbr(self):
+        f = audio.mp3_duration
+        data = xing_frame(38281) + mp3_frame() * 3
+        self.assertAlmostEqual(f(data, 123), 1000.0, places=0)
+
+
+CASSETTES_DIR = os.path.join(os.path.dirname(__file__), 'tests', 'cassettes')
+
+
+def cassette_body(name: str) -> bytes:
+    with open(os.path.join(CASSETTES_DIR, name)) as f:
+        cassette = json.load(f)
+
+    body = cassette['http_interactions'][0]['response']['body']
+
+    return gzip.decompress(base64.b64decode(body['base64_string']))
+
+
+def make_station() -> Station:
+    return Station.objects.create(
+        name='Говорит Москва',
+        short_latin_name='gm',
+        url='https://govoritmoskva.ru',
+        logo='https://govoritmoskva.ru/logo.png',
+        programs_root='https://govoritmoskva.ru/broadcasts/',
+    )
+
+
+def make_program(**kwargs) -> Program:
+    fields = {
+        'title_ru': 'Своя правда',
+        'title_en': 'svoja_pravda',
+        'description': 'Дебаты по актуальным темам дня.',
+        'url': 'https://govoritmoskva.ru/broadcasts/161/',
+        'feed_url': 'http://127.0.0.1:8000/feeds/gm/svoja_pravda.xml',
+        'image_path': 'https://my.domain.com/images/svoja_pravda.png',
+        'status': 'current',
+    }
+    fields.update(kwargs)
+
+    if 'station' not in fields:
+        fields['station'] = make_station()
+
+    return Program.objects.create(**fields)
+
+
+def make_episode(day: int = 4, **kwargs) -> Episode:
+    file_url = (
+        f'https://govoritmoskva.ru/media/broadcasts/audio/2019/07/{day:02}/'
+        f'2019_07_{day:02}_Svoya_pravda.mp3'
+    )
+
+    fields = {
+        'date': datetime(2019, 7, day),
+        'title': f'Своя правда (2019-07-{day:02})',
+        'description': '<b>Татьяна Никонова</b><br>автор учебника<br>',
+        'duration': 3000,
+        'guests': [],
+        'file_name': os.path.basename(file_url),
+        'file_url': file_url,
+        'file_size': 48000000,
+    }
+    fields.update(kwargs)
+
+    return Episode(**fields)
+
+
+def fake_date(*today):
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return cls(*today)
+
+    return FakeDate
+
+
+class FakeResponse:
+
+    def __init__(self, chunks, status_code=200, headers=None):
+        self.chunks = chunks
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b''.join(chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        yield from self.chunks
+
+
+class FileInfoTests(TestCase):
+
+    def test_file_info_probes_header(self):
+        url = 'https://example.com/episode.mp3'
+        head = mp3_frame() * 40
+
+        with mock.patch.object(
+                parsers, 'fetch_range', return_value=(head, 16000000)), \
+                mock.patch.object(parsers, 'download_file_info') as download:
+            self.assertEqual(parsers.file_info(url, 'episode.mp3'),
+                             (1000, 16000000))
+            download.assert_not_called()
+
+        record = EpisodeRecord.objects.get(url_hash=parsers.string_hash(url))
+        self.assertEqual((record.duration, record.size), (1000, 16000000))
+
+    def test_file_info_falls_back_to_download(self):
+        url = 'https://example.com/episode.mp3'
+
+        with mock.patch.object(
+                parsers, 'fetch_range', return_value=(bytes(4096), None)), \
+                mock.patch.object(
+                    parsers, 'download_file_info', return_value=(60, 1024)):
+            self.assertEqual(parsers.file_info(url, 'episode.mp3'), (60, 1024))
+
+    def test_episode_records_in_one_query(self):
+        urls = [f'https://example.com/{i}.mp3' for i in range(3)]
+        for duration, url in enumerate(urls[:2]):
+            EpisodeRecord.objects.create(
+                url=url,
+                url_hash=parsers.string_hash(url),
+                duration=duration,
+                size=100,
+            )
+
+        with self.assertNumQueries(1):
+            records = parsers.episode_records(urls)
+
+        self.assertEqual(records, {urls[0]: (0, 100), urls[1]: (1, 100)})
+
+    def test_file_info_uses_prefetched_records(self):
+        url = 'https://example.com/episode.mp3'
+
+        with self.assertNumQueries(0):
+            info = parsers.file_info(url, 'episode.mp3', {url: (60, 1024)})
+
+        self.assertEqual(info, (60, 1024))
+
+    def test_download_file_info_streams_to_temp_file(self):
+        seen = {}
+
+        def fake_tag(path):
+            seen['path'] = path
+            seen['size'] = os.path.getsize(path)
+            return mock.Mock(duration=60.5, filesize=seen['size'])
+
+        response = FakeResponse([b'a' * 10, b'b' * 5])
+
+        with mock.patch.object(parsers, 'http_get',
+                               return_value=response), \
+                mock.patch.object(TinyTag, 'get', fake_tag):
+            info = parsers.download_file_info('https://e.com/a.mp3', 'a.mp3')
+
+        self.assertEqual(info, (60, 15))
+        self.assertTrue(seen['path'].endswith('.mp3'))
+        self.assertNotEqual(os.path.basename(seen['path']), 'a.mp3')
+        self.assertFalse(os.path.exists(seen['path']))
+
+
+class ListingDatesTests(TestCase):
+
+    def setUp(self):
+        self.program = make_program()
+
+    def parse(self, month: date, raw_dt: str):
+        url = 'https://govoritmoskva.ru/media/episode.mp3'
+        raw_episode = BeautifulSoup(
+            f'<li><div class="time"><span>{raw_dt}</span></div>'
+            f'<p class="header">«Тема»</p>'
+            f'<a class="download" download="episode.mp3" href="{url}"></a>'
+            f'</li>',
+            'html.parser',
+        ).li
+
+        return parsers.parse_gm_episode(
+            self.program, month, raw_episode, {url: (3000, 48000000)},
+        )
+
+    def test_year_comes_from_listed_month(self):
+        # Older than a year: today's year, rolled back once, was wrong
+        episode = self.parse(date(2017, 3, 1), '26 марта')
+        self.assertEqual(episode.date, datetime(2017, 3, 26))
+
+        episode = self.parse(date(2019, 1, 1), '31 декабря')
+        self.assertEqual(episode.date, datetime(2018, 12, 31))
+
+    def test_impossible_dates_do_not_break_the_build(self):
+        self.assertIsNone(parsers.parse_ru_date_fast('29 февраля', 2026))
+        self.assertEqual(parsers.parse_ru_datetime('29 февраля', 2024),
+                         datetime(2024, 2, 29))
+
+        with self.assertLogs('rsser.parsers', level='WARNING'):
+            self.assertIsNone(self.parse(date(2026, 2, 1), '30 февраля'))
+
+    def test_backfill_months_must_be_positive(self):
+        for value in ('0', '-3', 'many'):
+            with self.subTest(value=value), self.assertRaises(CommandError):
+                call_command('build_rss_files', '--backfill-months', value)
+
+
+class EpisodesPipelineTests(TestCase):
+
+    def test_parse_gm_episodes_keeps_order(self):
+        raw_episodes = [(date(2019, 7, 1), i) for i in range(8)]
+
+        def fake_parse(program, month, raw_episode, records=None):
+            time.sleep(0.01 * (8 - raw_episode))
+            return None if raw_episode == 3 else f'episode {raw_episode}'
+
+        with mock.patch.object(parsers, 'collect_gm_raw_episodes',
+                               return_value=raw_episodes), \
+                mock.patch.object(parsers, 'prefetch_gm_episode_records',
+                                  return_value={}), \
+                mock.patch.object(parsers, 'parse_gm_episode', fake_parse):
+            threaded = parsers.parse_gm_episodes(None, workers=4)
+            sequential = parsers.parse_gm_episodes(None, workers=1)
+
+        self.assertEqual(threaded, [
+            f'episode {i}' for i in (0, 1, 2, 4, 5, 6, 7)
+        ])
+        self.assertEqual(sequential, threaded)
+
+
+class NetworkTests(TestCase):
+
+    def test_token_bucket_burst_then_rate(self):
+        bucket = network.TokenBucket(rate=2, burst=3)
+        waits = [bucket.reserve() for _ in range(5)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 0.5, places=2)
+        self.assertAlmostEqual(waits[4], 1.0, places=2)
+
+    def test_token_bucket_unlimited(self):
+        bucket = network.TokenBucket(rate=0, burst=1)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0, 0, 0])
+
+    def test_buckets_are_per_host(self):
+        limits = {'cdn.example.com': (10, 5)}
+
+        with self.settings(SCRAPER_HOST_RATE_LIMITS=limits), \
+                mock.patch.dict(network._buckets, clear=True):
+            site = network.host_bucket('example.com')
+            cdn = network.host_bucket('cdn.example.com')
+
+            self.assertIs(network.host_bucket('example.com'), site)
+            self.assertEqual((cdn.rate, cdn.burst), (10, 5))
+            self.assertEqual((site.rate, site.burst), (0.5, 1))
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+        settings_override = self.settings(HTTP_CACHE_DIR=self.cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_fetch_page_revalidates(self):
+        url = 'https://example.com/broadcasts/'
+        page = b'<div id="programs"></div>'
+        fresh = FakeResponse([page], headers={'ETag': '"v1"'})
+        not_modified = FakeResponse([], status_code=304)
+
+        with mock.patch.object(network, 'http_get',
+                               side_effect=[fresh, not_modified]) as get:
+            first = network.fetch_page(url)
+            second = network.fetch_page(url)
+
+        self.assertFalse(first.not_modified)
+        self.assertTrue(second.not_modified)
+        self.assertEqual(second.content, page)
+        self.assertEqual(second.validator, '"v1"')
+        self.assertEqual(
+            get.call_args_list[1][1]['headers'],
+            {'If-None-Match': '"v1"'},
+        )
+
+    def test_get_page_soup_reuses_unchanged_page(self):
+        url = 'https://example.com/broadcasts/161/'
+        fresh = FakeResponse([b'<p>1</p>'], headers={'ETag': '"v1"'})
+        not_modified = FakeResponse([], status_code=304)
+
+        with mock.patch.object(network, 'http_get',
+                               side_effect=[fresh, not_modified]):
+            first = parsers.get_page_soup(url)
+            second = parsers.get_page_soup(url)
+
+        self.assertIs(first, second)
+
+
+class FeedWriterTests(TestCase):
+
+    def setUp(self):
+        feeds_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(feeds_dir.cleanup)
+
+        settings_override = self.settings(FEEDS_DIR=feeds_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.program = make_program()
+
+    def test_write_feed_skips_unchanged_feed(self):
+        episodes = [make_episode(4), make_episode(3)]
+        file_name = parsers.feed_file_path(self.program)
+
+        self.assertTrue(parsers.write_feed(self.program, episodes))
+        mtime = os.stat(file_name).st_mtime_ns
+
+        self.assertFalse(parsers.write_feed(self.program, episodes))
+        self.assertEqual(os.stat(file_name).st_mtime_ns, mtime)
+
+        self.program.refresh_from_db()
+        self.assertEqual(
+            self.program.feed_fingerprint,
+            parsers.feed_fingerprint(self.program, episodes),
+        )
+
+    def test_write_feed_rewrites_changed_feed(self):
+        parsers.write_feed(self.program, [make_episode(3)])
+
+        episodes = [make_episode(4), make_episode(3)]
+        self.assertTrue(parsers.write_feed(self.program, episodes))
+
+        with open(parsers.feed_file_path(self.program), 'rb') as f:
+            self.assertIn(b'2019_07_04_Svoya_pravda.mp3', f.read())
+
+    def test_feed_files_follow_umask(self):
+        file_name = parsers.feed_file_path(self.program)
+
+        for umask, mode in ((0o022, 0o644), (0o027, 0o640)):
+            with mock.patch.object(utils, 'UMASK', umask):
+                parsers.write_feed(self.program, [make_episode(4)], force=True)
+
+            self.assertEqual(os.stat(file_name).st_mode & 0o777, mode)
+            self.assertEqual(os.stat(file_name + '.gz').st_mode & 0o777, mode)
+
+
+class BuildRssFilesTests(TestCase):
+
+    def test_failing_program_does_not_abort_build(self):
+        program = make_program()
+        make_program(
+            title_ru='Умные парни',
+            title_en='umnye_parni',
+            station=program.station,
+        )
+
+        def fake_builder(adapter, program):
+            if program.title_en == 'svoja_pravda':
+                raise ValueError('broken page')
+            return True
+
+        with mock.patch.object(gm.GmAdapter, 'build_feed',
+                               fake_builder), \
+                self.assertLogs('rsser.parsers', level='ERROR'):
+            results = parsers.build_rss_files()
+
+        self.assertEqual(results, [
+            parsers.BuildResult('Своя правда', False,
+                                'ValueError: broken page'),
+            parsers.BuildResult('Умные парни', True, None),
+        ])
+
+    def test_dead_worker_does_not_abort_build(self):
+        station = make_station()
+        for title_ru, title_en in (
+                ('Провиант', 'proviant'),
+                ('Своя правда', 'svoja_pravda'),
+                ('Умные парни', 'umnye_parni')):
+            make_program(
+                title_ru=title_ru,
+                title_en=title_en,
+                station=station,
+            )
+
+        def fake_builder(adapter, program):
+            if program.title_en == 'svoja_pravda':
+                os._exit(1)
+            return True
+
+        # Programs go to the pool one at a time, so only the program of
+        # the dead worker fails
+        with mock.patch.object(gm.GmAdapter, 'build_feed',
+                               fake_builder), \
+                mock.patch.object(gm.GmAdapter, 'max_concurrency', 1), \
+                self.assertLogs('rsser.parsers', level='ERROR'):
+            results = parsers.build_rss_files(workers=2)
+
+        self.assertEqual(
+            [(result.program, result.changed) for result in results],
+            [('Провиант', True), ('Своя правда', False),
+             ('Умные парни', True)],
+        )
+        self.assertTrue(results[1].error.startswith('BrokenProcessPool'))
+        self.assertFalse(
+            station.programs.filter(next_refresh__isnull=True).exists()
+        )
+
+    def test_command_reports_failures(self):
+        results = [
+            parsers.BuildResult('Своя правда', False, 'ValueError: broken'),
+            parsers.BuildResult('Умные парни', True, None),
+        ]
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        command = 'rsser.management.commands.build_rss_files'
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+
+        with mock.patch(f'{command}.build_rss_files',
+                        return_value=results) as build, \
+                self.settings(METRICS_DIR=metrics_dir.name,
+                              LOCKS_DIR=metrics_dir.name):
+            with self.assertRaises(CommandError):
+                call_command('build_rss_files', workers=3,
+                             stdout=stdout, stderr=stderr)
+
+        build.assert_called_once_with(
+            workers=3, force=False, backfill_months=None,
+        )
+        self.assertIn('changed: 1, failed: 1', stdout.getvalue())
+        self.assertIn('Своя правда: ValueError: broken', stderr.getvalue())
+
+    def test_rate_limits_are_shared_by_workers(self):
+        with mock.patch.dict(network._buckets, clear=True):
+            network.scale_rate_limits(1 / 4)
+            self.addCleanup(network.scale_rate_limits, 1.0)
+
+            self.assertEqual(network.host_rate_limit('example.com'),
+                             (0.125, 1))
+
+            with self.settings(SCRAPER_RATE_BURST=8):
+                self.assertEqual(network.host_rate_limit('example.com'),
+                                 (0.125, 2))
+
+
+class HttpClientTests(TestCase):
+
+    def test_session_is_shared_and_retries(self):
+        network.reset_session()
+        self.addCleanup(network.reset_session)
+
+        session = network.get_session()
+        self.assertIs(network.get_session(), session)
+
+        retry = session.get_adapter('https://example.com').max_retries
+        self.assertIsInstance(retry, network.JitterRetry)
+        self.assertEqual(retry.total, 3)
+        self.assertIn(503, retry.status_forcelist)
+
+    def test_backoff_has_jitter(self):
+        retry = network.JitterRetry(total=5, backoff_factor=1)
+        for _ in range(3):
+            retry = retry.increment(method='GET', url='/')
+
+        backoffs = {retry.get_backoff_time() for _ in range(20)}
+        self.assertGreater(len(backoffs), 1)
+        self.assertTrue(all(2 <= backoff <= 6 for backoff in backoffs))
+
+    def test_http_get_throttles_and_sets_timeout(self):
+        session = mock.Mock()
+        session.get.return_value = FakeResponse([b''])
+
+        with mock.patch.object(network, 'get_session', return_value=session), \
+                mock.patch.object(network, 'throttle') as throttle:
+            network.http_get('https://example.com/a.mp3', stream=True)
+
+        throttle.assert_called_once_with('https://example.com/a.mp3')
+        session.get.assert_called_once_with(
+            'https://example.com/a.mp3', stream=True, timeout=30,
+        )
+
+
+class HtmlParsingTests(TestCase):
+
+    def test_strained_program_page_matches_full_parse(self):
+        content = cassette_body('gm/episode.json')
+        full = BeautifulSoup(content, 'html.parser')
+        strained = parsers.parse_html(content, parsers.GM_PROGRAM_PAGE)
+
+        def summary(soup):
+            page = soup.find('div', {'class': 'oneProgramPage'})
+            episodes = page.ul.findChildren('li', recursive=False)
+            return (
+                page.find('div', {'class', 'pageHeader'}).h1.text,
+                page.find('div', {'class', 'textDescribe'}).text.split(),
+                [e.find('div', {'class': 'time'}).span.text for e in episodes],
+                [str(e.find('a', {'class': 'download'})) for e in episodes],
+            )
+
+        self.assertEqual(summary(strained), summary(full))
+        self.assertIsNone(strained.find('div', {'class': 'rightColumn'}))
+
+
+class RuDatetimeTests(TestCase):
+
+    def test_parse_ru_datetime_fast_path(self):
+        f = parsers.parse_ru_datetime
+        self.assertEqual(f('04 июля', 2019), datetime(2019, 7, 4))
+        self.assertEqual(f('1 Мая', 2019), datetime(2019, 5, 1))
+        self.assertEqual(f('04 июля 2018', 2019), datetime(2018, 7, 4))
+        self.assertEqual(f('31 декабря 2018, 17:05', 2019),
+                         datetime(2018, 12, 31, 17, 5))
+
+    def test_parse_ru_datetime_matches_dateparser(self):
+        year = date.today().year
+        for raw_dt in ('04 июля', '15 февраля', '04 июля 2018, 17:00'):
+            self.assertEqual(
+                parsers.parse_ru_datetime(raw_dt, year),
+                dateparser.parse(raw_dt, ['ru']),
+            )
+
+    def test_parse_ru_datetime_falls_back_to_dateparser(self):
+        with mock.patch.object(dateparser, 'parse',
+                               return_value=datetime(2019, 7, 3)) as parse:
+            self.assertEqual(parsers.parse_ru_datetime('вчера', 2019),
+                             datetime(2019, 7, 3))
+
+        parse.assert_called_once_with('вчера', ['ru'])
+
+    def test_shift_month(self):
+        f = parsers.shift_month
+        self.assertEqual(f(date(2019, 7, 31), 0), date(2019, 7, 1))
+        self.assertEqual(f(date(2019, 3, 31), -1), date(2019, 2, 1))
+        self.assertEqual(f(date(2019, 1, 15), -1), date(2018, 12, 1))
+        self.assertEqual(f(date(2019, 1, 15), -13), date(2017, 12, 1))
+
+
+class ReconcileProgramsTests(TestCase):
+
+    def scraped(self, station, title_ru):
+        return Program(
+            title_ru=title_ru,
+            title_en=parsers.ru_title_to_en(title_ru),
+            description=title_ru,
+            url='https://govoritmoskva.ru/broadcasts/1/',
+            feed_url='http://127.0.0.1:8000/feeds/gm/program.xml',
+            station=station,
+        )
+
+    def test_reconcile_programs(self):
+        station = make_station()
+        make_program(station=station, status='new')
+        make_program(station=station, title_ru='Умные парни')
+
+        scraped = [
+            self.scraped(station, 'Своя правда'),
+            self.scraped(station, 'Провиант'),
+            self.scraped(station, 'Провиант'),
+            self.scraped(station, 'Своя правда (повтор)'),
+        ]
+
+        self.assertTrue(parsers.reconcile_programs(station, scraped))
+
+        statuses = dict(station.programs.values_list('title_ru', 'status'))
+        self.assertEqual(statuses, {
+            'Своя правда': 'current',
+            'Провиант': 'new',
+            'Умные парни': 'archive',
+        })
+
+    def test_reconcile_programs_without_changes(self):
+        program = make_program()
+        scraped = [self.scraped(program.station, program.title_ru)]
+
+        self.assertFalse(
+            parsers.reconcile_programs(program.station, scraped)
+        )
+
+
+class FeedViewTests(TestCase):
+
+    def setUp(self):
+        feeds_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(feeds_dir.cleanup)
+
+        settings_override = self.settings(FEEDS_DIR=feeds_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.program = make_program()
+        parsers.write_feed(self.program, [make_episode(4), make_episode(3)])
+        self.url = '/feeds/gm/svoja_pravda.xml'
+
+    def test_feed_is_served_with_validators(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'],
+                         'application/rss+xml; charset=utf-8')
+        self.assertEqual(response['ETag'],
+                         caching.content_etag(response.content))
+        self.program.refresh_from_db()
+        self.assertEqual(response['Last-Modified'],
+                         http_date(self.program.feed_updated.timestamp()))
+
+    def test_feed_answers_conditional_requests(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(
+            self.url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_same_day_episode_moves_last_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        second_part = make_episode(
+            4,
+            title='Своя правда (2019-07-04), часть 2',
+            file_url='https://govoritmoskva.ru/media/2019_07_04_part_2.mp3',
+        )
+        later = timezone.now() + timedelta(minutes=5)
+
+        with mock.patch.object(timezone, 'now', return_value=later):
+            parsers.write_feed(
+                self.program,
+                [second_part, make_episode(4), make_episode(3)],
+            )
+
+        response = self.client.get(
+            self.url,
+            HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'2019_07_04_part_2.mp3', response.content)
+        self.assertEqual(response['Last-Modified'],
+                         http_date(later.timestamp()))
+
+    def test_feed_from_files_without_feed_updated(self):
+        Program.objects.update(feed_updated=None)
+        cache.clear()
+
+        response = self.client.get(self.url)
+        mtime = os.path.getmtime(parsers.feed_file_path(self.program))
+
+        self.assertEqual(response['Last-Modified'], http_date(mtime))
+
+    def test_feed_falls_back_to_file(self):
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        with open(parsers.feed_file_path(self.program), 'rb') as f:
+            self.assertEqual(response.content, f.read())
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_feed_is_served_precompressed(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(
+            self.url,
+            HTTP_ACCEPT_ENCODING='gzip;q=1.0, identity; q=0.5, *;q=0',
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+
+        path = parsers.feed_file_path(self.program)
+        with open(f'{path}.gz', 'rb') as f:
+            self.assertEqual(f.read(), response.content)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+    @skipUnless(caching.brotli, 'brotli is not installed')
+    def test_feed_prefers_brotli(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_stale_siblings_are_removed(self):
+        path = parsers.feed_file_path(self.program)
+        with open(f'{path}.br', 'wb') as f:
+            f.write(b'old feed')
+
+        with mock.patch.object(caching, 'brotli', None):
+            parsers.write_feed(self.program, [make_episode(4)], force=True)
+
+        self.assertFalse(os.path.exists(f'{path}.br'))
+        self.assertTrue(os.path.exists(f'{path}.gz'))
+
+        cache.clear()
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_preferred_encoding(self):
+        f = caching.preferred_encoding
+        self.assertEqual(f('gzip, deflate, br', {'gzip'}), 'gzip')
+        self.assertEqual(f('gzip, br', {'gzip', 'br'}), 'br')
+        self.assertEqual(f('br;q=0, gzip', {'gzip', 'br'}), 'gzip')
+        self.assertIsNone(f('', {'gzip'}))
+        self.assertIsNone(f('deflate', {'gzip'}))
+
+    def test_missing_feed(self):
+        response = self.client.get('/feeds/gm/missing.xml')
+        self.assertEqual(response.status_code, 404)
+
+
+class IndexViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.station = make_station()
+        self.program = make_program(station=self.station)
+
+    def test_programs_are_prefetched(self):
+        make_program(station=self.station, title_ru='Умные парни')
+        make_program(station=self.station, title_ru='Провиант', status='new')
+        make_program(station=self.station, title_ru='Архив', status='archive')
+        other_station = Station.objects.create(
+            name='Другая станция',
+            short_latin_name='other',
+            url='https://example.com',
+            logo='https://example.com/logo.png',
+            programs_root='https://example.com/programs/',
+        )
+        make_program(station=other_station, title_ru='Вечер')
+
+        # One query for the stations and one for all of their programs
+        with self.assertNumQueries(2):
+            response = self.client.get('/')
+
+        content = response.content.decode('utf-8')
+        titles = ['Провиант', 'Своя правда', 'Умные парни']
+        positions = [content.index(title) for title in titles]
+
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn('Вечер', content)
+        self.assertNotIn('Архив', content)
+
+    def test_page_is_served_from_cache(self):
+        first = self.client.get('/')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/')
+
+        self.assertEqual(first.content, second.content)
+
+    def test_invalidation_reaches_other_processes(self):
+        self.client.get('/')
+
+        # The build commands run apart from the web workers
+        process = multiprocessing.get_context('fork').Process(
+            target=caching.invalidate_index_page,
+        )
+        process.start()
+        process.join()
+
+        self.assertIsNone(caching.load_index_page())
+
+    def test_program_changes_invalidate_page(self):
+        self.client.get('/')
+
+        self.program.description = 'Новое описание'
+        self.program.save()
+
+        self.assertContains(self.client.get('/'), 'Новое описание')
+
+        self.program.delete()
+
+        self.assertNotContains(self.client.get('/'), 'Своя правда')
+
+    def test_reconciliation_invalidates_page(self):
+        self.client.get('/')
+        scraped = Program(
+            title_ru='Провиант',
+            title_en='proviant',
+            url='https://govoritmoskva.ru/broadcasts/2/',
+            feed_url='http://127.0.0.1:8000/feeds/gm/proviant.xml',
+            station=self.station,
+        )
+
+        parsers.reconcile_programs(self.station, [self.program, scraped])
+
+        self.assertIsNone(caching.load_index_page())
+        self.assertContains(self.client.get('/'), 'Провиант')
+
+    def test_changed_feeds_invalidate_page(self):
+        self.client.get('/')
+        unchanged = [parsers.BuildResult('Своя правда', False, None)]
+        changed = [parsers.BuildResult('Своя правда', True, None)]
+
+        with mock.patch.object(parsers, 'build_stations',
+                               return_value=unchanged):
+            parsers.build_rss_files()
+        self.assertIsNotNone(caching.load_index_page())
+
+        with mock.patch.object(parsers, 'build_stations',
+                               return_value=changed):
+            parsers.build_rss_files()
+        self.assertIsNone(caching.load_index_page())
+
+
+class EpisodeStoreTests(TestCase):
+
+    def setUp(self):
+        feeds_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(feeds_dir.cleanup)
+
+        settings_override = self.settings(
+            FEEDS_DIR=feeds_dir.name,
+            METRICS_DIR=os.path.join(feeds_dir.name, 'metrics'),
+            LOCKS_DIR=os.path.join(feeds_dir.name, 'locks'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.program = make_program()
+
+    def test_store_episodes_upserts(self):
+        f = parsers.store_episodes
+        self.assertEqual(f(self.program, [make_episode(3)]), 1)
+        episodes = [make_episode(4), make_episode(3)]
+        self.assertEqual(f(self.program, episodes), 1)
+        self.assertEqual(f(self.program, [make_episode(4, title='New')]), 1)
+        self.assertEqual(f(self.program, [make_episode(4, title='New')]), 0)
+
+        self.assertEqual(
+            list(self.program.episodes.values_list('title', flat=True)),
+            ['New', 'Своя правда (2019-07-03)'],
+        )
+
+    def test_stored_episodes_survive_site_drops(self):
+        episodes = [make_episode(4), make_episode(3)]
+        parsers.store_episodes(self.program, episodes)
+        parsers.store_episodes(self.program, [make_episode(4)])
+
+        episodes = parsers.stored_episodes(self.program)
+        self.assertEqual([e.date.day for e in episodes], [4, 3])
+
+    def test_render_feeds_from_database(self):
+        episodes = [make_episode(4), make_episode(3)]
+        parsers.store_episodes(self.program, episodes)
+        make_program(
+            title_ru='Умные парни',
+            title_en='umnye_parni',
+            station=self.program.station,
+        )
+
+        stdout = io.StringIO()
+        call_command('render_feeds', stdout=stdout)
+        self.assertIn('Programs: 2, changed: 1, failed: 0', stdout.getvalue())
+
+        with open(parsers.feed_file_path(self.program), 'rb') as f:
+            content = f.read()
+        self.assertIn(b'2019_07_03_Svoya_pravda.mp3', content)
+        self.assertIn(b'Thu, 04 Jul 2019 00:00:00 +0000', content)
+
+        call_command('render_feeds', stdout=stdout)
+        self.assertIn('changed: 0', stdout.getvalue())
+
+        call_command('render_feeds', force=True, stdout=stdout)
+        self.assertIn('changed: 1', stdout.getvalue().splitlines()[-1])
+
+
+class BackfillTests(TestCase):
+
+    def setUp(self):
+        self.program = make_program()
+
+    def store_daily_episodes(self, days: int):
+        now = timezone.now()
+        parsers.Episode.objects.bulk_create([
+            make_episode(
+                program=self.program,
+                guid=str(day),
+                date=now - timedelta(days=day),
+            )
+            for day in range(days)
+        ])
+
+    def test_months_to_scan(self):
+        f = parsers.months_to_scan
+        self.assertEqual(f(self.program, 10), 6)
+
+        with mock.patch.object(parsers, 'date', fake_date(2019, 7, 20)):
+            self.store_daily_episodes(90)
+            self.assertEqual(f(self.program, 10), 1)
+            self.assertEqual(f(self.program, 30), 2)
+
+            self.program.episodes.exclude(guid__in=['0', '7', '14']).delete()
+            self.assertEqual(f(self.program, 10), 6)
+
+    def test_collect_stops_when_enough_episodes(self):
+        months = []
+
+        def fake_month(program, month):
+            months.append(month)
+            return [f'{month:%Y-%m} episode'] * 4
+
+        with self.settings(MONTH_WORKERS=2), \
+                mock.patch.object(parsers, 'collect_gm_month_episodes',
+                                  fake_month), \
+                mock.patch.object(parsers, 'date', fake_date(2019, 2, 10)):
+            raw_episodes = parsers.collect_gm_raw_episodes(
+                self.program,
+                desired_episodes_num=10,
+                months=6,
+            )
+
+        self.assertEqual(sorted(months), [
+            date(2018, 11, 1),
+            date(2018, 12, 1),
+            date(2019, 1, 1),
+            date(2019, 2, 1),
+        ])
+        self.assertEqual(raw_episodes[:5], ['2019-02 episode'] * 4 + [
+            '2019-01 episode',
+        ])
+        self.assertEqual(len(raw_episodes), 16)
+
+
+class CoverArtTests(TestCase):
+
+    def setUp(self):
+        static_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(static_dir.cleanup)
+
+        self.images_dir = os.path.join(static_dir.name, 'rsser', 'images')
+        source_dir = os.path.join(
+            os.path.dirname(__file__), 'static', 'rsser', 'images',
+        )
+        os.makedirs(self.images_dir)
+        for name in (utils.GM_TEMPLATE_NAME, utils.GM_FONT_NAME):
+            shutil.copy(os.path.join(source_dir, name), self.images_dir)
+
+        env = mock.patch.dict(os.environ, {
+            'STATIC_DIR': static_dir.name,
+            'SITE_URL': 'https://my.domain.com',
+        })
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_prepare_gm_image_skips_identical_art(self):
+        url = utils.prepare_gm_image('Своя правда', 'svoja_pravda')
+        self.assertEqual(url, 'https://my.domain.com/images/svoja_pravda.png')
+
+        path = os.path.join(self.images_dir, 'svoja_pravda.png')
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+        self.assertEqual(utils.existing_image_hash(path),
+                         utils.gm_image_hash('Своя правда'))
+
+        with mock.patch.object(utils, 'render_gm_image') as render:
+            utils.prepare_gm_image('Своя правда', 'svoja_pravda')
+        render.assert_not_called()
+
+        with mock.patch.object(utils, 'render_gm_image',
+                               wraps=utils.render_gm_image) as render:
+            utils.prepare_gm_image('Своя правда!', 'svoja_pravda')
+        render.assert_called_once_with('Своя правда!')
+
+    def test_prepare_gm_image_writes_webp(self):
+        with self.settings(GM_IMAGE_WEBP=True):
+            utils.prepare_gm_image('Умные парни', 'umnye_parni')
+
+        webp_path = os.path.join(self.images_dir, 'umnye_parni.webp')
+        with Image.open(webp_path) as image:
+            self.assertEqual(image.format, 'WEBP')
+
+    def test_fonts_are_loaded_once_per_size(self):
+        utils.gm_font.cache_clear()
+
+        utils.render_gm_image('Своя правда')
+        utils.render_gm_image('Умные парни')
+        utils.render_gm_image('Очень длинное название программы про всё')
+
+        self.assertEqual(utils.gm_font.cache_info().currsize, 2)
+
+
+class StreamingRssTests(TestCase):
+
+    def setUp(self):
+        self.program = make_program(
+            title_ru='Своя <правда> & "мы"',
+            description='Дебаты & споры',
+        )
+        self.episodes = [
+            make_episode(4, description='<b>Гость</b><br>"эксперт"<br>'),
+            make_episode(3, duration=37250, file_size=1),
+        ]
+
+    def normalized(self, content: bytes) -> bytes:
+        return re.sub(
+            rb'\s*<(generator|lastBuildDate)>[^<]*</\1>',
+            b'',
+            content,
+        )
+
+    def test_matches_feedgen_output(self):
+        for pretty in (True, False):
+            feedgen = parsers.collect_feed(self.program, self.episodes)
+            expected = feedgen.rss_str(pretty=pretty)
+            content = rss.rss_bytes(self.program, self.episodes, pretty)
+
+            self.assertEqual(self.normalized(content),
+                             self.normalized(expected))
+
+    def test_write_rss_streams_to_file(self):
+        out = io.BytesIO()
+        rss.write_rss(out, self.program, iter(self.episodes))
+
+        self.assertEqual(
+            self.normalized(out.getvalue()),
+            self.normalized(rss.rss_bytes(self.program, self.episodes)),
+        )
+
+    def test_invalid_xml_characters_are_dropped(self):
+        self.assertEqual(rss.escape_text('a\x0bb & <c>'), 'ab &amp; &lt;c&gt;')
+        self.assertEqual(rss.escape_attr('"a"\n'), '&quot;a&quot;&#10;')
+
+    def test_itunes_duration(self):
+        self.assertEqual(rss.itunes_duration(3725), '01:02:05')
+        self.assertEqual(rss.itunes_duration(59), '00:00:59')
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+
+        settings_override = self.settings(METRICS_DIR=metrics_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_prometheus_text(self):
+        metrics.HTTP_REQUESTS.inc(host='example.com', status=200)
+        metrics.HTTP_REQUESTS.inc(host='example.com', status=200)
+        metrics.HTML_PARSE_SECONDS.observe(0.02)
+
+        text = metrics.render_text({'web': metrics.snapshot()})
+
+        self.assertIn('# TYPE rsser_http_requests_total counter', text)
+        self.assertIn(
+            'rsser_http_requests_total'
+            '{process="web",host="example.com",status="200"} 2.0',
+            text,
+        )
+        self.assertIn(
+            'rsser_html_parse_seconds_bucket{process="web",le="0.01"} 0',
+            text,
+        )
+        self.assertIn(
+            'rsser_html_parse_seconds_bucket{process="web",le="0.025"} 1',
+            text,
+        )
+        self.assertIn(
+            'rsser_html_parse_seconds_count{process="web"} 1', text,
+        )
+
+    def test_merge_adds_worker_snapshots(self):
+        metrics.EPISODE_RECORDS.inc(result='hit')
+        metrics.HTML_PARSE_SECONDS.observe(0.5)
+        worker = metrics.snapshot()
+
+        metrics.merge(worker)
+        metrics.merge(json.loads(json.dumps(worker)))
+
+        self.assertEqual(metrics.EPISODE_RECORDS.values, {('hit',): 3.0})
+        counts, total, count = metrics.HTML_PARSE_SECONDS.values[()]
+        self.assertEqual((total, count), (1.5, 3))
+
+    def test_http_get_and_file_info_are_counted(self):
+        session = mock.Mock()
+        session.get.return_value = FakeResponse(
+            [b'<html></html>'], status_code=404,
+        )
+
+        with mock.patch.object(network, 'get_session', return_value=session), \
+                mock.patch.object(network, 'throttle'):
+            network.http_get('https://example.com/page')
+
+        url = 'https://example.com/episode.mp3'
+        parsers.file_info(url, 'episode.mp3', {url: (60, 1000)})
+
+        self.assertEqual(metrics.HTTP_REQUESTS.values, {
+            ('example.com', '404'): 1.0,
+        })
+        self.assertEqual(
+            metrics.HTTP_RESPONSE_BYTES.values, {('example.com',): 13.0},
+        )
+        self.assertEqual(metrics.EPISODE_RECORDS.values, {('hit',): 1.0})
+
+    def test_worker_returns_its_metrics(self):
+        program = make_program()
+        metrics.PROGRAM_BUILDS.inc(result='stale')
+
+        with mock.patch.object(gm.GmAdapter, 'build_feed',
+                               return_value=True):
+            result, worker_metrics = parsers.build_program_feed_in_worker(
+                program.pk,
+            )
+
+        self.assertEqual(
+            result, parsers.BuildResult('Своя правда', True, None),
+        )
+        self.assertEqual(
+            worker_metrics['rsser_program_builds_total']['values'],
+            [[['changed'], 1.0]],
+        )
+
+    def test_view_includes_command_dumps(self):
+        metrics.PROGRAM_BUILDS.inc(result='changed')
+        metrics.dump('build_rss_files')
+        metrics.reset()
+
+        response = self.client.get('/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            'rsser_program_builds_total'
+            '{process="build_rss_files",result="changed"} 1.0',
+            response.content.decode('utf-8'),
+        )
+
+
+class StationAdapterTests(TestCase):
+
+    def setUp(self):
+        adapters = mock.patch.dict(stations._adapters)
+        adapters.start()
+        self.addCleanup(adapters.stop)
+
+    def test_adapters_are_found_by_short_latin_name(self):
+        station = make_station()
+        self.assertIsInstance(
+            stations.get_adapter(station), gm.GmAdapter,
+        )
+
+        station.short_latin_name = 'unknown'
+        with self.assertLogs('rsser.stations', level='WARNING'):
+            self.assertIsNone(stations.get_adapter(station))
+
+    def test_adapters_are_loaded_from_settings(self):
+        stations._adapters.clear()
+
+        with self.settings(STATION_ADAPTERS=['rsser.gm.GmAdapter']):
+            stations.load_adapters()
+
+        self.assertEqual(list(stations.adapters()), ['gm'])
+        self.assertIsInstance(
+            stations.get_adapter(make_station()), gm.GmAdapter,
+        )
+
+    def test_incomplete_adapters_are_rejected(self):
+        class IncompleteAdapter(stations.StationAdapter):
+            short_latin_name = 'incomplete'
+
+            def build_feed(self, program, **options):
+                return True
+
+        with self.assertRaises(TypeError):
+            stations.register(IncompleteAdapter)
+
+        self.assertNotIn('incomplete', stations.adapters())
+
+    def test_build_pool_is_sized_to_station_concurrency(self):
+        self.assertEqual(parsers.build_pool_size(2), 2)
+
+        with self.assertLogs('rsser.parsers', level='WARNING'):
+            self.assertEqual(parsers.build_pool_size(8), 2)
+
+    def test_unknown_stations_are_skipped(self):
+        make_program(station=Station.objects.create(
+            name='Неизвестная станция',
+            short_latin_name='unknown',
+            url='https://example.com',
+            logo='https://example.com/logo.png',
+            programs_root='https://example.com/programs/',
+        ))
+
+        with self.assertLogs('rsser.stations', level='WARNING'):
+            self.assertEqual(parsers.build_rss_files(), [])
+            parsers.update_programs()
+
+    def test_declared_rate_limits_are_split_between_workers(self):
+        adapter = gm.GmAdapter()
+        self.addCleanup(adapter.declare_rate_limits)
+
+        self.assertEqual(
+            network.host_rate_limit('govoritmoskva.ru'), (0.5, 1),
+        )
+
+        adapter.declare_rate_limits(workers=4)
+        self.assertEqual(
+            network.host_rate_limit('govoritmoskva.ru'), (0.25, 1),
+        )
+
+        with self.settings(SCRAPER_HOST_RATE_LIMITS={
+                'govoritmoskva.ru': (2.0, 4)}):
+            self.assertEqual(
+                network.host_rate_limit('govoritmoskva.ru'), (1.0, 2),
+            )
+
+    def test_stations_are_built_in_parallel(self):
+        both_started = threading.Barrier(2, timeout=5)
+
+        @stations.register
+        class OtherAdapter(stations.StationAdapter):
+            short_latin_name = 'other'
+            hosts = ('other.example.com',)
+
+            def build_feed(self, program, **options):
+                both_started.wait()
+                return True
+
+            def update_programs(self, station):
+                pass
+
+            def prepare_image(self, program):
+                return ''
+
+        def gm_build_feed(adapter, program, **options):
+            both_started.wait()
+            return False
+
+        make_program()
+        make_program(
+            title_ru='Другая программа',
+            title_en='drugaja_programma',
+            station=Station.objects.create(
+                name='Другая станция',
+                short_latin_name='other',
+                url='https://other.example.com',
+                logo='https://other.example.com/logo.png',
+                programs_root='https://other.example.com/programs/',
+            ),
+        )
+
+        with mock.patch.object(gm.GmAdapter, 'build_feed',
+                               gm_build_feed):
+            results = parsers.build_rss_files()
+
+        self.assertEqual(sorted(results), [
+            parsers.BuildResult('Другая программа', True, None),
+            parsers.BuildResult('Своя правда', False, None),
+        ])
+
+
+class SchedulerTests(TestCase):
+
+    def setUp(self):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+
+        settings_override = self.settings(
+            LOCKS_DIR=state_dir.name,
+            METRICS_DIR=state_dir.name,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+
+    def test_job_lock_is_exclusive(self):
+        with scheduler.job_lock('feeds') as first:
+            with scheduler.job_lock('feeds') as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+
+            with scheduler.job_lock('catalog') as other:
+                self.assertTrue(other)
+
+        with scheduler.job_lock('feeds') as again:
+            self.assertTrue(again)
+
+    def test_locked_and_failing_jobs(self):
+        def broken():
+            raise ValueError('broken')
+
+        runner = scheduler.Scheduler([])
+
+        with scheduler.job_lock('feeds'), \
+                self.assertLogs('rsser.scheduler', level='WARNING'):
+            result = runner.run_job(scheduler.Job('feeds', 60, broken))
+        self.assertEqual(result, 'skipped')
+
+        with self.assertLogs('rsser.scheduler', level='ERROR'):
+            result = runner.run_job(scheduler.Job('feeds', 60, broken))
+        self.assertEqual(result, 'failed')
+
+        self.assertEqual(
+            runner.run_job(scheduler.Job('feeds', 60, lambda: None)), 'ok',
+        )
+
+    def test_jobs_run_on_their_own_intervals(self):
+        runs = []
+
+        def feeds():
+            runs.append('feeds')
+            if runs.count('feeds') == 3:
+                runner.stop()
+
+        runner = scheduler.Scheduler([
+            scheduler.Job('catalog', 3600, lambda: runs.append('catalog')),
+            scheduler.Job('feeds', 0, feeds),
+        ])
+        runner.run()
+
+        self.assertEqual(runs, ['catalog', 'feeds', 'feeds', 'feeds'])
+
+    def test_sigterm_lets_the_running_job_finish(self):
+        runs = []
+
+        def feeds():
+            os.kill(os.getpid(), signal.SIGTERM)
+            runs.append('finished')
+
+        runner = scheduler.Scheduler([scheduler.Job('feeds', 0, feeds)])
+        runner.run()
+
+        self.assertEqual(runs, ['finished'])
+        self.assertTrue(runner.stopping.is_set())
+
+    def test_command_skips_when_feeds_are_locked(self):
+        stderr = io.StringIO()
+        command = 'rsser.management.commands.build_rss_files'
+
+        with mock.patch(f'{command}.build_rss_files') as build, \
+                scheduler.job_lock('feeds'):
+            call_command('build_rss_files', stderr=stderr)
+
+        build.assert_not_called()
+        self.assertIn('skipping', stderr.getvalue())
+
+    def test_workers_ignore_stop_signals(self):
+        with parsers.start_build_pool(2) as executor:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handler = executor.submit(signal.getsignal, signum).result()
+                self.assertEqual(handler, signal.SIG_IGN)
+
+    def test_broken_pool_is_replaced(self):
+        command = 'rsser.management.commands.run_scheduler'
+        scheduler_command = load_command_class('rsser', 'run_scheduler')
+        scheduler_command.stderr = io.StringIO()
+        scheduler_command.workers = 2
+        scheduler_command.executor = broken = parsers.start_build_pool(2)
+        self.addCleanup(broken.shutdown)
+
+        # A worker killed between runs, like the OOM killer would
+        with self.assertRaises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+
+        with mock.patch(f'{command}.build_rss_files') as build:
+            scheduler_command.build_feeds()
+
+        executor = scheduler_command.executor
+        self.addCleanup(executor.shutdown)
+
+        self.assertIsNot(executor, broken)
+        self.assertTrue(parsers.ping_build_pool(executor))
+        build.assert_called_once_with(executor=executor)
+        self.assertIn('broken', scheduler_command.stderr.getvalue())
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class CadenceTests(TestCase):
+
+    hour = timedelta(hours=1)
+    week = timedelta(days=7)
+
+    def next_refresh(self, dates, now):
+        return cadence.next_refresh(dates, now, self.hour, self.week)
+
+    def test_weekday_show_with_dates_only(self):
+        # Mon-Fri, 2019-07-01 is a Monday
+        dates = [
+            utc(2019, 7, day)
+            for day in (1, 2, 3, 4, 5, 8, 9, 10, 11, 12)
+        ]
+
+        learned = cadence.learn_cadence(dates)
+        self.assertEqual(learned.weekdays, frozenset(range(5)))
+        self.assertIsNone(learned.hour)
+        self.assertEqual(
+            cadence.next_publication(learned), utc(2019, 7, 15),
+        )
+
+        # Quiet over the weekend, hourly while Monday's episode is due
+        self.assertEqual(
+            self.next_refresh(dates, utc(2019, 7, 13, 9)),
+            utc(2019, 7, 14, 23),
+        )
+        self.assertEqual(
+            self.next_refresh(dates, utc(2019, 7, 15, 9)),
+            utc(2019, 7, 15, 10),
+        )
+
+    def test_weekly_show_with_hours(self):
+        dates = [utc(2019, 7, day, 10, 5) for day in (6, 13, 20, 27)]
+
+        self.assertEqual(
+            cadence.next_publication(cadence.learn_cadence(dates)),
+            utc(2019, 8, 3, 10),
+        )
+        self.assertEqual(
+            self.next_refresh(dates, utc(2019, 7, 28, 12)),
+            utc(2019, 8, 3, 9),
+        )
+        self.assertEqual(
+            self.next_refresh(dates, utc(2019, 8, 3, 11)),
+            utc(2019, 8, 3, 12),
+        )
+
+    def test_silent_and_unknown_programs_are_polled_rarely(self):
+        dates = [utc(2019, 7, day) for day in (1, 2, 3)]
+        now = utc(2019, 12, 1)
+
+        self.assertEqual(self.next_refresh(dates, now), now + self.week)
+        self.assertEqual(
+            self.next_refresh(dates[:1], now), now + timedelta(days=1),
+        )
+        self.assertEqual(
+            self.next_refresh([], now), now + timedelta(days=1),
+        )
+
+
+class RefreshScheduleTests(TestCase):
+
+    def setUp(self):
+        self.program = make_program()
+        self.built = []
+
+        def fake_builder(adapter, program, **options):
+            self.built.append(program.title_en)
+            if program.title_en == 'broken':
+                raise ValueError('broken page')
+            return True
+
+        builder = mock.patch.object(
+            gm.GmAdapter, 'build_feed', fake_builder,
+        )
+        builder.start()
+        self.addCleanup(builder.stop)
+
+    def test_only_due_programs_are_built(self):
+        now = timezone.now()
+        Program.objects.filter(pk=self.program.pk).update(
+            next_refresh=now + timedelta(hours=5),
+        )
+        make_program(
+            title_ru='Архив',
+            title_en='archive',
+            status='archive',
+            station=self.program.station,
+        )
+        make_program(
+            title_ru='Пора',
+            title_en='due',
+            next_refresh=now - timedelta(minutes=1),
+            station=self.program.station,
+        )
+
+        parsers.build_rss_files()
+        self.assertEqual(self.built, ['due'])
+
+        self.built.clear()
+        parsers.build_rss_files(force=True)
+        self.assertEqual(
+            sorted(self.built), ['archive', 'due', 'svoja_pravda'],
+        )
+
+    def test_next_refresh_is_planned_after_build(self):
+        make_program(
+            title_ru='Сломанная',
+            title_en='broken',
+            station=self.program.station,
+        )
+        parsers.store_episodes(
+            self.program, [make_episode(day) for day in (1, 2, 3, 4, 5)],
+        )
+
+        with self.assertLogs('rsser.parsers', level='ERROR'):
+            parsers.build_rss_files()
+
+        program = Program.objects.get(title_en='svoja_pravda')
+        broken = Program.objects.get(title_en='broken')
+
+        self.assertEqual(broken.next_refresh - broken.last_scraped,
+                         timedelta(hours=1))
+        # Silent since July 2019, so it is left alone for a week
+        self.assertEqual(program.next_refresh - program.last_scraped,
+                         timedelta(days=7))
+
+    def test_publication_hours_are_station_time(self):
+        # A daily show at 10:00 Moscow time, which is 07:00 UTC
+        episodes = [
+            make_episode(day, date=datetime(2019, 7, day, 10))
+            for day in range(1, 8)
+        ]
+        parsers.store_episodes(self.program, episodes)
+
+        # 09:30 in Moscow: polling already started an hour before 10:00
+        now = utc(2019, 7, 8, 6, 30)
+        next_refresh = parsers.plan_next_refresh(self.program, now)
+
+        self.assertEqual(
+            next_refresh - now,
+            timedelta(seconds=settings.REFRESH_MIN_INTERVAL),
+        )
+
+
+IMPORT_TIME_RE = re.compile(
+    r'^import time:\s+\d+ \|\s+(?P<cumulative>\d+) \| (?P<module>.+)$',
+    re.MULTILINE,
+)
+
+
+class LazyImportTests(TestCase):
+    # The import time budgets are checked by benchmarks/bench_imports.py,
+    # wall-clock assertions here would depend on the machine's load
+
+    # Only needed on first use, nothing should import them at startup
+    LAZY_MODULES = {
+        'dateparser',
+        'feedgen',
+        'PIL',
+        'tinytag',
+        'transliterate',
+    }
+    SCRAPER_MODULES = LAZY_MODULES | {
+        'bs4',
+        'lxml',
+        'requests',
+        'rsser.parsers',
+    }
+
+    def import_times(self, code: str) -> dict:
+        env = {
+            **os.environ,
+            'BUILD_ON_TRAVIS': '1',
+            'DJANGO_SETTINGS_MODULE': 'project.settings',
+        }
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        return {
+            match['module'].strip(): int(match['cumulative']) / 1_000_000
+            for match
+            in IMPORT_TIME_RE.finditer(result.stderr)
+        }
+
+    def loaded(self, times: dict, modules: set) -> set:
+        return {
+            module
+            for module in times
+            if module in modules or module.split('.')[0] in modules
+        }
+
+    def test_web_workers_do_not_import_scraper(self):
+        times = self.import_times('import project.wsgi; import project.urls')
+
+        self.assertEqual(self.loaded(times, self.SCRAPER_MODULES), set())
+
+    def test_management_commands_import_lazily(self):
+        commands = sorted(
+            name
+            for name, app in get_commands().items()
+            if app == 'rsser'
+        )
+        self.assertIn('build_rss_files', commands)
+
+        for name in commands:
+            module = f'rsser.management.commands.{name}'
+
+            with self.subTest(command=name):
+                times = self.import_times(
+                    f'import django; django.setup(); import {module}'
+                )
+
+                self.assertEqual(self.loaded(times, self.LAZY_MODULES), set())
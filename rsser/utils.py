@@ -1,48 +1,173 @@
+import hashlib
+import io
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from decouple import config
 from django.conf import settings
-from PIL import Image, ImageDraw, ImageFont
 
+# Pillow is only needed to draw program images, so web workers and
+# commands that never draw one do not pay for importing it
+if TYPE_CHECKING:
+    from PIL import Image, ImageFont
+
+GM_TEMPLATE_NAME = 'gm_logo_template.png'
+GM_FONT_NAME = 'Ubuntu-Bold.ttf'
+GM_IMAGE_HASH_KEY = 'rsser-hash'
+
+# os.umask() can only be read by setting it, so it is read once on import
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def images_dir() -> str:
+    return os.path.join(
+        settings.BASE_DIR,
+        f'{config("STATIC_DIR")}/rsser/images',
+    )
+
+
+@lru_cache(maxsize=None)
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def gm_template(path: str) -> 'Image.Image':
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.load()
+        return image.copy()
 
-def prepare_gm_image(
-        program_title_ru: str,
-        program_title_en: str) -> str:
 
+@lru_cache(maxsize=None)
+def gm_font(path: str, size: int) -> 'ImageFont.FreeTypeFont':
+    from PIL import ImageFont
+
+    return ImageFont.truetype(path, size)
+
+
+def gm_font_size(program_title_ru: str) -> int:
     default_font_size = 26
 
     if len(program_title_ru) > 25:
         length_ratio = 25 / len(program_title_ru)
-        font_size = int(default_font_size * length_ratio * 1.2)
-    else:
-        font_size = default_font_size
-
-    image = Image.open(
-        os.path.join(
-            settings.BASE_DIR,
-            f'{config("STATIC_DIR")}/rsser/images/gm_logo_template.png'
-        )
-    )
+        return int(default_font_size * length_ratio * 1.2)
+
+    return default_font_size
+
+
+def gm_image_hash(program_title_ru: str) -> str:
+    template_path = os.path.join(images_dir(), GM_TEMPLATE_NAME)
+    font_path = os.path.join(images_dir(), GM_FONT_NAME)
+
+    parts = [
+        program_title_ru,
+        file_digest(template_path),
+        file_digest(font_path),
+        str(settings.GM_IMAGE_WEBP),
+    ]
+
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def existing_image_hash(path: str) -> Optional[str]:
+    from PIL import Image
 
-    fnt = ImageFont.truetype(
-        os.path.join(
-            settings.BASE_DIR,
-            f'{config("STATIC_DIR")}/rsser/images/Ubuntu-Bold.ttf'
-        ),
-        font_size
+    try:
+        with Image.open(path) as image:
+            return image.text.get(GM_IMAGE_HASH_KEY)
+    except (OSError, AttributeError):
+        return None
+
+
+def render_gm_image(program_title_ru: str) -> 'Image.Image':
+    from PIL import ImageDraw
+
+    image = gm_template(os.path.join(images_dir(), GM_TEMPLATE_NAME)).copy()
+    fnt = gm_font(
+        os.path.join(images_dir(), GM_FONT_NAME),
+        gm_font_size(program_title_ru),
     )
 
-    title_width, _ = fnt.getsize(program_title_ru)
+    # Right edge of the text box, what FreeTypeFont.getsize used to return
+    title_width = fnt.getbbox(program_title_ru)[2]
 
     draw = ImageDraw.Draw(image)
     text_start_x = int((image.width / 2) - (title_width / 2))
     text_start_y = 245
     draw.text((text_start_x, text_start_y), program_title_ru, font=fnt)
 
+    return image
+
+
+def save_image(image: 'Image.Image', path: str, **params) -> None:
+    buffer = io.BytesIO()
+    image.save(buffer, **params)
+    write_file_atomic(path, buffer.getvalue())
+
+
+def prepare_gm_image(
+        program_title_ru: str,
+        program_title_en: str) -> str:
+
+    from PIL import PngImagePlugin
+
     image_file_name = f'{program_title_en}.png'
-    prepared_image_path = f'{config("STATIC_DIR")}/rsser/images/{image_file_name}'
-    image.save(prepared_image_path)
+    prepared_image_path = os.path.join(images_dir(), image_file_name)
+    image_hash = gm_image_hash(program_title_ru)
+
+    if existing_image_hash(prepared_image_path) != image_hash:
+        image = render_gm_image(program_title_ru)
+
+        png_info = PngImagePlugin.PngInfo()
+        png_info.add_text(GM_IMAGE_HASH_KEY, image_hash)
+        save_image(
+            image,
+            prepared_image_path,
+            format='PNG',
+            optimize=True,
+            pnginfo=png_info,
+        )
+
+        if settings.GM_IMAGE_WEBP:
+            webp_path = os.path.join(images_dir(), f'{program_title_en}.webp')
+            save_image(image, webp_path, format='WEBP', quality=90, method=6)
 
     image_url = f'{config("SITE_URL")}/images/{image_file_name}'
 
     return image_url
+
+
+def prepare_gm_images(
+        titles: List[Tuple[str, str]],
+        workers: int = 1) -> List[str]:
+
+    if workers <= 1 or len(titles) <= 1:
+        return [prepare_gm_image(*title) for title in titles]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(prepare_gm_image, *zip(*titles)))
+
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates 0600 files, give them the usual permissions so
+        # the web server can read the feeds
+        os.chmod(tmp_path, 0o666 & ~UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
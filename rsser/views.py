@@ -1,16 +1,98 @@
-from django.http import HttpResponse
-from django.shortcuts import render
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
 
+from rsser import metrics
+from rsser.caching import (
+    load_feed,
+    load_index_page,
+    preferred_encoding,
+    store_index_page,
+)
+from rsser.models import Station, Program
 
-from django.shortcuts import render
 
-from rsser.models import Station, Program
-from rsser.parsers import build_rss_files, update_gm_programs
+def render_index_page() -> str:
+    listed_programs = (
+        Program.objects
+        .exclude(status='archive')
+        .order_by('title_ru')
+    )
+    stations = Station.objects.prefetch_related(
+        Prefetch('programs', listed_programs, to_attr='listed_programs'),
+    )
+
+    # Nothing on the page depends on the request, so it is shared by all
+    return render_to_string('rsser/index.html', {'stations': stations})
 
 
+@require_safe
 def index(request):
-    context = {
-        'stations': Station.objects.all(),
-    }
+    content = load_index_page()
+
+    if content is None:
+        content = render_index_page()
+        store_index_page(content)
+
+    return HttpResponse(content)
+
+
+@require_safe
+def feed(request, station: str, program: str):
+    cached_feed = load_feed(station, program)
+
+    if cached_feed is None:
+        raise Http404(f'No feed for {station}/{program}')
+
+    encoding = preferred_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''),
+        cached_feed.encoded,
+    )
+
+    if encoding:
+        content = cached_feed.encoded[encoding]
+        etag = cached_feed.variant_etag(encoding)
+    else:
+        content = cached_feed.content
+        etag = cached_feed.etag
+
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=cached_feed.last_modified,
+    )
+
+    if response is None:
+        response = HttpResponse(
+            content,
+            content_type='application/rss+xml; charset=utf-8',
+        )
+
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    metrics.FEED_RESPONSES.inc(
+        status=response.status_code,
+        encoding=encoding or 'identity',
+    )
+
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    if cached_feed.last_modified:
+        response['Last-Modified'] = http_date(cached_feed.last_modified)
+
+    return response
+
+
+@require_safe
+def metrics_view(request):
+    sources = {'web': metrics.snapshot(), **metrics.load_dumps()}
 
-    return render(request, 'rsser/index.html', context)
+    return HttpResponse(
+        metrics.render_text(sources),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )